@@ -0,0 +1,317 @@
+import asyncio
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+from datetime import datetime
+
+from constants import (
+    BACKUP_PAGES_PER_STEP,
+    BACKUP_RETENTION,
+    DATABASE_STRUCTURE,
+    SQLITEFILE,
+)
+from database_connection import connect_sync
+
+# Tables that only ever get rows appended, tracked by their highest id. Every
+# other table is tracked row by row since its rows are updated in place.
+APPEND_ONLY_TABLES = {"match_history": "match", "elo_history": "id"}
+
+
+def backup_dir(db_file=SQLITEFILE):
+    return os.path.join(os.path.dirname(os.path.abspath(db_file)), "backup")
+
+
+def list_backups(db_file=SQLITEFILE, label=None, extension="gz"):
+    directory = backup_dir(db_file)
+    if not os.path.exists(directory):
+        return []
+    suffix = f"_{os.path.basename(db_file)}.{extension}"
+    if label is not None:
+        suffix = f"_{label}{suffix}"
+    return sorted(
+        os.path.join(directory, name)
+        for name in os.listdir(directory)
+        if name.endswith(suffix)
+    )
+
+
+def _backup_name(db_file, label, extension):
+    return os.path.join(
+        backup_dir(db_file),
+        f"{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}_{label}_{os.path.basename(db_file)}.{extension}",
+    )
+
+
+def _state_file(db_file):
+    return os.path.join(
+        backup_dir(db_file), f"delta_state_{os.path.basename(db_file)}.json.gz"
+    )
+
+
+def _read_json(path):
+    with gzip.open(path, "rt") as f:
+        return json.load(f)
+
+
+def _write_json(path, data):
+    with gzip.open(path + ".tmp", "wt") as f:
+        json.dump(data, f, separators=(",", ":"))
+    os.replace(path + ".tmp", path)
+
+
+def _digest(row):
+    return hashlib.blake2b(repr(tuple(row)).encode(), digest_size=8).hexdigest()
+
+
+def _tracked_tables(conn):
+    tables = [
+        name
+        for (name,) in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' ORDER BY name"
+        )
+    ]
+    return [
+        table
+        for table in tables
+        if table in DATABASE_STRUCTURE or table == "sqlite_sequence"
+    ]
+
+
+def _key_column(table):
+    if table == "sqlite_sequence":
+        return "name"
+    return APPEND_ONLY_TABLES.get(table) or DATABASE_STRUCTURE[table][0]
+
+
+def _schema(conn):
+    return [
+        sql
+        for (sql,) in conn.execute(
+            "SELECT sql FROM sqlite_master WHERE sql IS NOT NULL ORDER BY name"
+        )
+    ]
+
+
+def _read_state(conn):
+    # Runs inside a read transaction so every table is seen at the same point.
+    state = {"schema": _schema(conn), "marks": {}, "rows": {}}
+    for table in _tracked_tables(conn):
+        key = _key_column(table)
+        if table in APPEND_ONLY_TABLES:
+            count, mark = conn.execute(
+                f"SELECT COUNT(*), COALESCE(MAX({key}), 0) FROM {table}"
+            ).fetchone()
+            state["marks"][table] = [mark, count]
+        else:
+            cursor = conn.execute(f"SELECT * FROM {table}")
+            index = [column[0] for column in cursor.description].index(key)
+            state["rows"][table] = {row[index]: _digest(row) for row in cursor}
+    return state
+
+
+def _save_state(db_file, base, sequence, state):
+    _write_json(
+        _state_file(db_file),
+        {
+            "base": base,
+            "sequence": sequence,
+            "schema": state["schema"],
+            "marks": state["marks"],
+            "rows": {
+                table: list(rows.items()) for table, rows in state["rows"].items()
+            },
+        },
+    )
+
+
+def _load_state(db_file):
+    path = _state_file(db_file)
+    if not os.path.exists(path):
+        return None
+    state = _read_json(path)
+    state["rows"] = {table: dict(rows) for table, rows in state["rows"].items()}
+    return state
+
+
+def snapshot(db_file=SQLITEFILE, label="manual", keep=BACKUP_RETENTION, track=False):
+    os.makedirs(backup_dir(db_file), exist_ok=True)
+    path = _backup_name(db_file, label, "gz")
+    raw = path[: -len(".gz")]
+
+    # The backup API copies a consistent snapshot a few pages at a time and
+    # restarts by itself if another connection writes in between.
+    source = connect_sync(db_file)
+    target = sqlite3.connect(raw)
+    try:
+        source.backup(target, pages=BACKUP_PAGES_PER_STEP, sleep=0.005)
+        if track:
+            _save_state(db_file, os.path.basename(path), 0, _read_state(target))
+    finally:
+        target.close()
+        source.close()
+
+    with open(raw, "rb") as src, gzip.open(path, "wb") as dst:
+        shutil.copyfileobj(src, dst)
+    os.remove(raw)
+
+    for old in list_backups(db_file, label)[:-keep]:
+        os.remove(old)
+    _prune_deltas(db_file)
+    return path
+
+
+def _prune_deltas(db_file):
+    directory = backup_dir(db_file)
+    for path in list_backups(db_file, "delta", "json.gz"):
+        base = _read_json(path)["base"]
+        if not os.path.exists(os.path.join(directory, base)):
+            os.remove(path)
+
+
+def _history_rewritten(conn, previous):
+    for table, (mark, count) in previous["marks"].items():
+        key = APPEND_ONLY_TABLES[table]
+        (seen,) = conn.execute(
+            f"SELECT COUNT(*) FROM {table} WHERE {key} <= ?", (mark,)
+        ).fetchone()
+        if seen != count:
+            return True
+    return False
+
+
+def _changes(conn, previous, state):
+    tables = {}
+    for table in _tracked_tables(conn):
+        key = _key_column(table)
+        if table in APPEND_ONLY_TABLES:
+            mark = previous["marks"].get(table, [0, 0])[0]
+            rows = conn.execute(
+                f"SELECT * FROM {table} WHERE {key} > ? ORDER BY {key}", (mark,)
+            ).fetchall()
+            deleted = []
+        else:
+            before = previous["rows"].get(table, {})
+            after = state["rows"][table]
+            changed = [pk for pk, digest in after.items() if before.get(pk) != digest]
+            deleted = [pk for pk in before if pk not in after]
+            rows = []
+            for start in range(0, len(changed), 500):
+                chunk = changed[start : start + 500]
+                rows += conn.execute(
+                    f"SELECT * FROM {table} WHERE {key} IN ({','.join('?' * len(chunk))})",
+                    chunk,
+                ).fetchall()
+        if rows or deleted:
+            columns = conn.execute(f"SELECT * FROM {table} LIMIT 0").description
+            tables[table] = {
+                "key": key,
+                "columns": [column[0] for column in columns],
+                "rows": [list(row) for row in rows],
+                "deleted": deleted,
+            }
+    return tables
+
+
+def delta(db_file=SQLITEFILE, keep=BACKUP_RETENTION):
+    previous = _load_state(db_file)
+    if previous is None or not os.path.exists(
+        os.path.join(backup_dir(db_file), previous["base"])
+    ):
+        return snapshot(db_file, keep=keep, track=True)
+
+    conn = connect_sync(db_file)
+    try:
+        conn.execute("BEGIN")
+        # A replay rewrites elo_history and a migration can rewrite any table,
+        # neither of which the marks can describe, so start a new base.
+        if _schema(conn) != previous["schema"] or _history_rewritten(conn, previous):
+            tables = None
+        else:
+            state = _read_state(conn)
+            tables = _changes(conn, previous, state)
+        conn.rollback()
+    finally:
+        conn.close()
+    if tables is None:
+        return snapshot(db_file, keep=keep, track=True)
+
+    sequence = previous["sequence"] + 1
+    path = _backup_name(db_file, "delta", "json.gz")
+    _write_json(
+        path,
+        {
+            "base": previous["base"],
+            "sequence": sequence,
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "tables": tables,
+        },
+    )
+    _save_state(db_file, previous["base"], sequence, state)
+    return path
+
+
+def apply_delta(conn, changes):
+    for table, change in changes["tables"].items():
+        key = change["key"]
+        index = change["columns"].index(key)
+        # Delete before inserting instead of INSERT OR REPLACE, sqlite_sequence
+        # has no unique constraint to replace on.
+        keys = change["deleted"] + [row[index] for row in change["rows"]]
+        for start in range(0, len(keys), 500):
+            chunk = keys[start : start + 500]
+            conn.execute(
+                f"DELETE FROM {table} WHERE {key} IN ({','.join('?' * len(chunk))})",
+                chunk,
+            )
+        conn.executemany(
+            f"INSERT INTO {table} ({', '.join(change['columns'])}) "
+            f"VALUES ({', '.join('?' * len(change['columns']))})",
+            change["rows"],
+        )
+
+
+def delta_chain(base):
+    directory = os.path.dirname(os.path.abspath(base))
+    name = os.path.basename(base)
+    chain = []
+    for path in sorted(os.listdir(directory)):
+        path = os.path.join(directory, path)
+        if "_delta_" in path and path.endswith(".json.gz"):
+            if _read_json(path)["base"] == name:
+                chain.append(path)
+    return chain
+
+
+def restore(base, output, deltas=None):
+    if deltas is None:
+        deltas = delta_chain(base)
+    changes = sorted((_read_json(path) for path in deltas), key=lambda d: d["sequence"])
+    name = os.path.basename(base)
+    for expected, change in enumerate(changes, start=1):
+        if change["base"] != name:
+            raise Exception("DeltaFromOtherBase")
+        if change["sequence"] != expected:
+            raise Exception("DeltaChainBroken")
+
+    with gzip.open(base, "rb") as src, open(output + ".tmp", "wb") as dst:
+        shutil.copyfileobj(src, dst)
+    conn = sqlite3.connect(output + ".tmp")
+    try:
+        with conn:
+            for change in changes:
+                apply_delta(conn, change)
+    finally:
+        conn.close()
+    os.replace(output + ".tmp", output)
+    return len(changes)
+
+
+async def create_backup(db_file=SQLITEFILE, label="manual", keep=BACKUP_RETENTION):
+    return await asyncio.to_thread(snapshot, db_file, label, keep, True)
+
+
+async def create_delta_backup(db_file=SQLITEFILE, keep=BACKUP_RETENTION):
+    return await asyncio.to_thread(delta, db_file, keep)
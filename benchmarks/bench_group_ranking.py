@@ -0,0 +1,103 @@
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import random
+import sqlite3
+import tempfile
+import time
+
+import database_connection
+from constants import SQLITEFILE
+from database import compute_standings, get_group_ranking, rebuild_standings
+from database_initialiser import init_db
+
+GROUPS = ["Pro League", "Advanced League-1", "Advanced League-2", "Entry League"]
+GROUP_SIZE = 12
+
+
+def build_history(matches, seed=0):
+    rng = random.Random(seed)
+    conn = sqlite3.connect(SQLITEFILE)
+    per_season = len(GROUPS) * GROUP_SIZE * (GROUP_SIZE - 1)
+    seasons = max(1, matches // per_season)
+    rows = []
+    for season in range(1, seasons + 1):
+        conn.execute(
+            "INSERT INTO seasons (season_number, active) VALUES (?, 0)", (season,)
+        )
+        for g, group in enumerate(GROUPS):
+            conn.execute(
+                "INSERT INTO groups (season_number, name, group_key) VALUES (?, ?, ?)",
+                (season, group, group.lower()),
+            )
+            players = range(g * GROUP_SIZE + 1, (g + 1) * GROUP_SIZE + 1)
+            for white in players:
+                for black in players:
+                    if white != black:
+                        rows.append(
+                            (
+                                white,
+                                black,
+                                rng.choice("wbd"),
+                                str(season),
+                                group,
+                                season,
+                                group.lower(),
+                            )
+                        )
+    conn.executemany(
+        """INSERT INTO match_history
+                 (whiteplayer, blackplayer, colorwon, season, league, season_number, group_key)
+             VALUES (?, ?, ?, ?, ?, ?, ?)""",
+        rows,
+    )
+    conn.commit()
+    conn.close()
+    return seasons, len(rows)
+
+
+async def time_ranking(season, repeat):
+    await database_connection.connect(SQLITEFILE)
+    await rebuild_standings()
+    timings = []
+    for query in (get_group_ranking, compute_standings):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            for group in GROUPS:
+                await query(season, group.lower())
+        timings.append((time.perf_counter() - start) / (repeat * len(GROUPS)))
+    await database_connection.close()
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark get_group_ranking")
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000, 400_000]
+    )
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    cwd = os.getcwd()
+    print(
+        f"{'matches':>10} {'seasons':>8} {'standings (ms)':>15} {'aggregate (ms)':>15}"
+    )
+    for size in args.sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            os.chdir(tmp)
+            try:
+                with contextlib.redirect_stdout(io.StringIO()):
+                    init_db()
+                seasons, matches = build_history(size)
+                table, aggregate = asyncio.run(time_ranking(seasons, args.repeat))
+            finally:
+                os.chdir(cwd)
+        print(
+            f"{matches:>10} {seasons:>8} {table * 1000:>15.3f} {aggregate * 1000:>15.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
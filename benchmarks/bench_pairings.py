@@ -0,0 +1,80 @@
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import random
+import shutil
+import sqlite3
+import tempfile
+import time
+
+import database_connection
+from constants import ROLES_CONFIG_FILE, SQLITEFILE
+from database import generate_pairings
+from database_initialiser import init_db
+from logic import get_role_ranges, plan_pairings, plan_subgroups
+
+
+class SilentContext:
+    async def send(self, *args, **kwargs):
+        pass
+
+
+def sign_up_players(count, seed=0):
+    rng = random.Random(seed)
+    conn = sqlite3.connect(SQLITEFILE)
+    conn.executemany(
+        "INSERT INTO players (id, elo, signed_up) VALUES (?, ?, 1)",
+        [(player_id, rng.gauss(1450, 120)) for player_id in range(1, count + 1)],
+    )
+    conn.execute("INSERT INTO seasons (season_number, active) VALUES (1, 0)")
+    conn.commit()
+    players = conn.execute("SELECT id, elo FROM players").fetchall()
+    conn.close()
+    return players
+
+
+async def time_generate():
+    await database_connection.connect(SQLITEFILE)
+    start = time.perf_counter()
+    ok = await generate_pairings(SilentContext(), 1)
+    elapsed = time.perf_counter() - start
+    (written,) = await database_connection.fetch_one("SELECT COUNT(*) FROM pairings")
+    await database_connection.close()
+    if not ok:
+        raise RuntimeError("generate_pairings failed")
+    return elapsed, written
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark generate_pairings")
+    parser.add_argument(
+        "--players", type=int, nargs="+", default=[1_000, 5_000, 20_000]
+    )
+    args = parser.parse_args()
+
+    cwd = os.getcwd()
+    roles_file = os.path.abspath(ROLES_CONFIG_FILE)
+    print(f"{'players':>8} {'pairings':>9} {'plan (ms)':>10} {'total (ms)':>11}")
+    for count in args.players:
+        with tempfile.TemporaryDirectory() as tmp:
+            shutil.copy(roles_file, tmp)
+            os.chdir(tmp)
+            try:
+                with contextlib.redirect_stdout(io.StringIO()):
+                    init_db()
+                players = sign_up_players(count)
+
+                start = time.perf_counter()
+                plan_pairings(plan_subgroups(players, get_role_ranges()))
+                plan = time.perf_counter() - start
+
+                total, written = asyncio.run(time_generate())
+            finally:
+                os.chdir(cwd)
+        print(f"{count:>8} {written:>9} {plan * 1000:>10.1f} {total * 1000:>11.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+import argparse
+import asyncio
+import os
+import random
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+
+import database_connection
+from benchmarks.run import _summary, run_suite
+from benchmarks.synthetic_league import build_league
+from constants import SQLITE_PROFILES
+from database import get_group_ranking
+
+
+def _writer(db_file, player_ids, stop, stats):
+    # A second connection committing small transactions, like the cleanup
+    # task or another bot process would.
+    conn = database_connection.connect_sync(db_file)
+    rng = random.Random(1)
+    while not stop.is_set():
+        try:
+            conn.execute(
+                "UPDATE players SET elo = elo WHERE id = ?", (rng.choice(player_ids),)
+            )
+            conn.commit()
+            stats["writes"] += 1
+        except sqlite3.OperationalError:
+            stats["locked"] += 1
+    conn.close()
+
+
+async def contended_reads(db_file, iterations):
+    await database_connection.connect(db_file)
+    try:
+        (season,) = await database_connection.fetch_one(
+            "SELECT MAX(season_number) FROM seasons"
+        )
+        groups = [
+            row[0]
+            for row in await database_connection.fetch_all(
+                "SELECT name FROM groups WHERE season_number = ?", (season,)
+            )
+        ]
+        player_ids = [
+            row[0]
+            for row in await database_connection.fetch_all("SELECT id FROM players")
+        ]
+        stop = threading.Event()
+        stats = {"writes": 0, "locked": 0, "read_errors": 0}
+        writer = threading.Thread(
+            target=_writer, args=(db_file, player_ids, stop, stats)
+        )
+        writer.start()
+        samples = []
+        try:
+            for i in range(iterations):
+                start = time.perf_counter()
+                try:
+                    await get_group_ranking(season, groups[i % len(groups)])
+                except sqlite3.OperationalError:
+                    stats["read_errors"] += 1
+                samples.append(time.perf_counter() - start)
+        finally:
+            stop.set()
+            writer.join()
+    finally:
+        await database_connection.close()
+    return _summary(samples), stats
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare SQLite connection profiles on a synthetic league"
+    )
+    parser.add_argument("--profiles", nargs="+", default=list(SQLITE_PROFILES))
+    parser.add_argument("--players", type=int, default=2000)
+    parser.add_argument("--seasons", type=int, default=10)
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        source = os.path.join(tmp, "source.db")
+        database_connection.configure(profile="default")
+        league = build_league(
+            source, players=args.players, seasons=args.seasons, seed=args.seed
+        )
+        print(f"league: {league}")
+
+        results = {}
+        for profile in args.profiles:
+            db_file = os.path.join(tmp, f"{profile}.db")
+            shutil.copy(source, db_file)
+            database_connection.configure(profile=profile)
+            suite = asyncio.run(
+                run_suite(db_file, args.iterations, random.Random(args.seed))
+            )
+            contended, stats = asyncio.run(contended_reads(db_file, args.iterations))
+            suite["get_group_ranking.contended"] = contended
+            results[profile] = (suite, stats)
+
+    names = list(next(iter(results.values()))[0])
+    print(f"{'p50 ms':<32}" + "".join(f"{profile:>12}" for profile in results))
+    for name in names:
+        print(
+            f"{name:<32}"
+            + "".join(
+                f"{suite[name]['p50_ms']:>12.3f}" for suite, _ in results.values()
+            )
+        )
+    for profile, (_, stats) in results.items():
+        print(
+            f"{profile}: concurrent writer committed {stats['writes']} times, "
+            f"{stats['locked']} locked errors, {stats['read_errors']} failed reads"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,274 @@
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import shutil
+import sqlite3
+import statistics
+import subprocess
+import tempfile
+import time
+from datetime import datetime
+
+import database_connection
+from benchmarks.synthetic_league import build_league
+from database import (
+    add_and_resolve_report,
+    bundle_leaderboard,
+    find_pairings_in_db,
+    generate_pairings,
+    get_group_ranking,
+    get_pairings_page,
+    invalidate_rating_caches,
+)
+from logic import calculate_sb
+
+
+class SilentContext:
+    async def send(self, *args, **kwargs):
+        pass
+
+
+def _summary(samples):
+    ordered = sorted(samples)
+    return {
+        "n": len(ordered),
+        "mean_ms": statistics.fmean(ordered) * 1000,
+        "p50_ms": ordered[len(ordered) // 2] * 1000,
+        "p95_ms": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000,
+        "max_ms": ordered[-1] * 1000,
+    }
+
+
+async def _time(calls):
+    samples = []
+    for call in calls:
+        start = time.perf_counter()
+        await call()
+        samples.append(time.perf_counter() - start)
+    return _summary(samples)
+
+
+async def run_suite(db_file, iterations, rng):
+    results = {}
+    await database_connection.connect(db_file)
+    try:
+        (season,) = await database_connection.fetch_one(
+            "SELECT season_number FROM seasons WHERE active = 1"
+        )
+        player_ids = [
+            row[0]
+            for row in await database_connection.fetch_all(
+                "SELECT DISTINCT player1_id FROM pairings WHERE season_number = ?",
+                (season,),
+            )
+        ]
+        groups = [
+            row[0]
+            for row in await database_connection.fetch_all(
+                "SELECT DISTINCT group_name FROM pairings WHERE season_number = ?",
+                (season,),
+            )
+        ]
+        role_members = [
+            row[0]
+            for row in await database_connection.fetch_all(
+                "SELECT id FROM players WHERE elo >= 1410"
+            )
+        ]
+        sample = [rng.choice(player_ids) for _ in range(iterations)]
+
+        async def cold_leaderboard(pid):
+            invalidate_rating_caches()
+            await bundle_leaderboard(pid, 10, None)
+
+        results["bundle_leaderboard.cold"] = await _time(
+            lambda pid=pid: cold_leaderboard(pid) for pid in sample
+        )
+        results["bundle_leaderboard.warm"] = await _time(
+            lambda pid=pid: bundle_leaderboard(pid, 10, None) for pid in sample
+        )
+        results["bundle_leaderboard.role"] = await _time(
+            lambda pid=pid: bundle_leaderboard(pid, 10, role_members) for pid in sample
+        )
+        results["get_group_ranking"] = await _time(
+            lambda group=rng.choice(groups): get_group_ranking(season, group)
+            for _ in range(iterations)
+        )
+
+        async def first_pairings_page(pid):
+            group_id, _season, _total = await find_pairings_in_db(pid, None, None)
+            await get_pairings_page(group_id)
+
+        results["find_pairings_in_db"] = await _time(
+            lambda pid=pid: first_pairings_page(pid) for pid in sample
+        )
+
+        open_pairings = await database_connection.fetch_all(
+            """SELECT player1_id, player2_id FROM pairings
+                 WHERE season_number = ? AND result1 IS NULL
+                 LIMIT ?""",
+            (season, 2 * iterations),
+        )
+        calls = []
+        for p1, p2 in open_pairings[:iterations]:
+            calls.append(lambda p1=p1, p2=p2: add_and_resolve_report(p1, p2, 1, "w"))
+            calls.append(lambda p1=p1, p2=p2: add_and_resolve_report(p2, p1, 1, "l"))
+        results["add_and_resolve_report"] = await _time(calls)
+
+        # Reports arriving together, as they would from several users at once.
+        concurrent = open_pairings[iterations:]
+        start = time.perf_counter()
+        for reporter, confirmer in ((0, 1), (1, 0)):
+            await asyncio.gather(
+                *(
+                    add_and_resolve_report(
+                        pair[reporter],
+                        pair[confirmer],
+                        1,
+                        "w" if reporter == 0 else "l",
+                    )
+                    for pair in concurrent
+                )
+            )
+        elapsed = time.perf_counter() - start
+        if concurrent:
+            results["add_and_resolve_report.concurrent"] = _summary(
+                [elapsed / (2 * len(concurrent))]
+            )
+    finally:
+        await database_connection.close()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        copy = os.path.join(tmp, os.path.basename(db_file))
+        shutil.copy(db_file, copy)
+        await database_connection.connect(copy)
+        try:
+            (latest,) = await database_connection.fetch_one(
+                "SELECT MAX(season_number) FROM seasons"
+            )
+            async with database_connection.transaction():
+                await database_connection.executemany(
+                    "INSERT INTO seasons (season_number, active) VALUES (?, 0)",
+                    [(latest + i,) for i in range(1, 4)],
+                )
+            results["generate_pairings"] = await _time(
+                lambda s=latest + i: generate_pairings(SilentContext(), s)
+                for i in range(1, 4)
+            )
+        finally:
+            await database_connection.close()
+
+    leaderboard_size = 12
+    leaderboards = []
+    for _ in range(iterations):
+        ids = list(range(leaderboard_size))
+        leaderboards.append(
+            [
+                {
+                    "id": pid,
+                    "points": rng.randint(0, 2 * leaderboard_size) / 2,
+                    "wonagainst": rng.sample(ids, rng.randint(0, leaderboard_size - 1)),
+                    "sb": 0,
+                }
+                for pid in ids
+            ]
+        )
+
+    async def sb(board):
+        calculate_sb(board)
+
+    results["calculate_sb"] = await _time(
+        lambda board=board: sb(board) for board in leaderboards
+    )
+    return results
+
+
+def _git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline_file, threshold):
+    with open(baseline_file) as f:
+        baseline = json.load(f)["results"]
+    regressions = []
+    for name, summary in results.items():
+        if name not in baseline:
+            continue
+        ratio = summary["p50_ms"] / max(baseline[name]["p50_ms"], 1e-9)
+        marker = ""
+        # Sub-0.05 ms medians are mostly scheduler noise.
+        if ratio > threshold and summary["p50_ms"] - baseline[name]["p50_ms"] > 0.05:
+            marker = "  <-- regression"
+            regressions.append(name)
+        print(f"{name:<28} {ratio:>6.2f}x p50{marker}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark the hot database.py and logic.py entry points"
+    )
+    parser.add_argument("--players", type=int, default=2000)
+    parser.add_argument("--seasons", type=int, default=10)
+    parser.add_argument("--matches", type=int, default=None)
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--compare", help="previous results file to compare against")
+    parser.add_argument("--threshold", type=float, default=1.25)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_file = os.path.join(tmp, "elo_bot.db")
+        start = time.perf_counter()
+        league = build_league(
+            db_file,
+            players=args.players,
+            seasons=args.seasons,
+            matches=args.matches,
+            seed=args.seed,
+        )
+        build_seconds = time.perf_counter() - start
+        results = asyncio.run(
+            run_suite(db_file, args.iterations, random.Random(args.seed))
+        )
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "revision": _git_revision(),
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "league": league,
+            "iterations": args.iterations,
+            "build_seconds": build_seconds,
+        },
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+
+    print(f"league: {league}")
+    for name, summary in results.items():
+        print(
+            f"{name:<28} n={summary['n']:<5} p50 {summary['p50_ms']:8.3f} ms"
+            f"  p95 {summary['p95_ms']:8.3f} ms  max {summary['max_ms']:8.3f} ms"
+        )
+    print(f"results written to {args.output}")
+    if args.compare and compare(results, args.compare, args.threshold):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+import argparse
+import asyncio
+import contextlib
+import io
+import random
+import sqlite3
+
+import database_connection
+from database import rebuild_standings
+from database_initialiser import init_db
+from logic import (
+    canonical_group_key,
+    get_expected_score,
+    get_role_ranges,
+    plan_pairings,
+    plan_subgroups,
+)
+
+
+def _play(rng, p1_strength, p2_strength, draw_rate):
+    if rng.random() < draw_rate:
+        return 0.5
+    return 1.0 if rng.random() < get_expected_score(p1_strength, p2_strength) else 0.0
+
+
+def build_league(
+    db_file,
+    players=1000,
+    seasons=5,
+    matches=None,
+    signup_rate=0.8,
+    completion=0.5,
+    draw_rate=0.1,
+    seed=0,
+):
+    rng = random.Random(seed)
+    with contextlib.redirect_stdout(io.StringIO()):
+        init_db(db_file)
+    role_ranges = get_role_ranges()
+
+    conn = sqlite3.connect(db_file)
+    strength = {pid: rng.gauss(1450, 150) for pid in range(1, players + 1)}
+    elo = dict(strength)
+    conn.executemany(
+        "INSERT INTO players (id, elo) VALUES (?, ?)", list(strength.items())
+    )
+
+    season = 0
+    total_matches = 0
+    while (matches is None and season < seasons) or (
+        matches is not None and total_matches < matches
+    ):
+        season += 1
+        signed = [pid for pid in strength if rng.random() < signup_rate]
+        subgroups = plan_subgroups(
+            [(pid, elo[pid]) for pid in signed], role_ranges, seed=rng.random()
+        )
+        pairings = plan_pairings(subgroups)
+        last = (matches is None and season == seasons) or (
+            matches is not None and total_matches + len(pairings) * 2 >= matches
+        )
+        conn.execute(
+            "INSERT INTO seasons (season_number, active) VALUES (?, ?)",
+            (season, int(last)),
+        )
+
+        group_ids = {
+            name: conn.execute(
+                "INSERT INTO groups (season_number, name, group_key) VALUES (?, ?, ?)",
+                (season, name, canonical_group_key(name)),
+            ).lastrowid
+            for name in subgroups
+        }
+        pairing_rows, history_rows, elo_rows = [], [], []
+        for p1, p2, group_name in pairings:
+            played = not last or rng.random() < completion
+            result1 = (
+                _play(rng, strength[p1], strength[p2], draw_rate) if played else None
+            )
+            result2 = (
+                _play(rng, strength[p1], strength[p2], draw_rate) if played else None
+            )
+            pairing_rows.append(
+                (p1, p2, result1, result2, season, group_name, group_ids[group_name])
+            )
+            if not played:
+                continue
+            key = canonical_group_key(group_name)
+            for white, black, score in ((p1, p2, result1), (p2, p1, 1 - result2)):
+                colorwon = {1.0: "w", 0.0: "b", 0.5: "d"}[score]
+                history_rows.append(
+                    (white, black, colorwon, str(season), group_name, season, key)
+                )
+            for pid in (p1, p2):
+                elo[pid] += rng.uniform(-12, 12)
+                elo_rows.append((pid, elo[pid]))
+
+        conn.executemany(
+            """INSERT INTO pairings
+                     (player1_id, player2_id, result1, result2, season_number, group_name, group_id)
+                 VALUES (?, ?, ?, ?, ?, ?, ?)""",
+            pairing_rows,
+        )
+        conn.executemany(
+            """INSERT INTO match_history
+                     (whiteplayer, blackplayer, colorwon, season, league, season_number, group_key)
+                 VALUES (?, ?, ?, ?, ?, ?, ?)""",
+            history_rows,
+        )
+        conn.executemany(
+            "INSERT INTO elo_history (player_id, elo_change) VALUES (?, ?)", elo_rows
+        )
+        total_matches += len(history_rows)
+        if last:
+            conn.executemany(
+                "UPDATE players SET signed_up = 1 WHERE id = ?",
+                [(pid,) for pid in signed],
+            )
+            break
+
+    conn.executemany(
+        "UPDATE players SET elo = ? WHERE id = ?",
+        [(value, pid) for pid, value in elo.items()],
+    )
+    conn.commit()
+    conn.close()
+    asyncio.run(_rebuild_standings(db_file))
+    return {"players": players, "seasons": season, "matches": total_matches}
+
+
+async def _rebuild_standings(db_file):
+    await database_connection.connect(db_file)
+    try:
+        await rebuild_standings()
+    finally:
+        await database_connection.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build a synthetic league database")
+    parser.add_argument("db_file")
+    parser.add_argument("--players", type=int, default=1000)
+    parser.add_argument("--seasons", type=int, default=5)
+    parser.add_argument(
+        "--matches",
+        type=int,
+        default=None,
+        help="keep adding seasons until match_history holds this many games",
+    )
+    parser.add_argument("--signup-rate", type=float, default=0.8)
+    parser.add_argument("--completion", type=float, default=0.5)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    print(
+        build_league(
+            args.db_file,
+            players=args.players,
+            seasons=args.seasons,
+            matches=args.matches,
+            signup_rate=args.signup_rate,
+            completion=args.completion,
+            seed=args.seed,
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
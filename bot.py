@@ -1,13 +1,20 @@
-import asyncio
 from datetime import datetime
 import discord
 from discord.ext import commands
 import math, csv, os, shlex
-from constants import INITIAL_ELO, ROLES_CONFIG_FILE, SQLITEFILE
+from constants import (
+    INITIAL_ELO,
+    PAIRINGS_CACHED_PAGES,
+    PAIRINGS_PER_PAGE,
+    PENDING_REP_MINUTES,
+    ROLES_CONFIG_FILE,
+)
 from database import (
     activate_season,
+    backfill_standings,
     bundle_leaderboard,
-    clean_old_pending_matches,
+    bundle_season_leaderboard,
+    leaderboard_cache_stats,
     find_pairings_in_db,
     find_player_group,
     add_and_resolve_report,
@@ -17,18 +24,30 @@ from database import (
     generate_pairings,
     get_group_ranking,
     get_latest_season,
+    get_pairings_page,
     get_pending_rep,
     get_player_data,
+    get_rating_history,
+    get_season_changes,
     find_signed_players,
     get_specific_pairing,
     punish_player,
+    rebuild_standings,
     register_new_player,
     sign_up_player,
+    start_pending_expiry,
+    sync_display_names,
+    update_display_names,
     update_missed_seasons,
-    update_player_stats,
 )
+from backup import create_backup, create_delta_backup
 from database_initialiser import init_db
-from logic import calculate_match_stats, get_role_ranges
+import database_connection
+from leaderboard_index import LRUCache
+from logic import find_role, get_role_ranges, sparkline
+import perf
+from role_sync import apply_role_changes, legacy_call_count, plan_role_changes
+from replay import apply_replay, diff_against_players, replay_history
 
 
 def load_config():
@@ -59,19 +78,36 @@ try:
         BACKUP_CHANNEL_ID = int(config["backup_channel_id"])
     else:
         BACKUP_CHANNEL_ID = None
+    database_connection.configure(config)
 
 except Exception as e:
     print(f"Configuration error: {e}")
     exit(1)
 
 
+class LeagueBot(commands.Bot):
+    async def close(self):
+        await super().close()
+        await database_connection.close()
+
+
 intents = discord.Intents.all()
-bot = commands.Bot(command_prefix="$", intents=intents, help_command=None)
+bot = LeagueBot(command_prefix="$", intents=intents, help_command=None)
 
 
 init_db()
 
 
+@bot.before_invoke
+async def start_command_timer(ctx):
+    perf.start_command(ctx.command.qualified_name)
+
+
+@bot.after_invoke
+async def stop_command_timer(ctx):
+    perf.finish_command(failed=ctx.command_failed)
+
+
 @bot.command(name="update_roles")
 @commands.has_permissions(manage_roles=True)
 async def update_player_roles(ctx):
@@ -87,104 +123,72 @@ async def update_player_roles(ctx):
 
         role_ranges = get_role_ranges()
 
-        players = find_signed_players()
+        players = await find_signed_players()
 
         if not players:
             await ctx.send("No signed up players found!")
             return
 
-        updated_count = 0
         progress_msg = await ctx.send("Updating roles... 0%")
+        if not ctx.guild.chunked:
+            await ctx.guild.chunk()
+
+        league_roles = {}
+        for role_range in role_ranges:
+            role = discord.utils.get(ctx.guild.roles, name=role_range["name"])
+            if role is None:
+                await ctx.send(f"⚠️ Role '{role_range['name']}' not found on server!")
+                continue
+            league_roles[role_range["name"]] = role
+
+        n_players = await find_unsigned_players()
+        await update_missed_seasons()
+        members = {}
+        for player_id, *_ in list(players) + list(n_players):
+            member = ctx.guild.get_member(player_id)
+            if member is not None:
+                members[player_id] = member
+
+        for player_id, elo, missed_seasons in n_players:
+            if player_id in members:
+                await punish_player(player_id, elo, missed_seasons)
+
+        # Signed-up players without a matching role keep whatever they have.
+        desired_roles = {}
+        for player_id, elo in players:
+            role = league_roles.get(find_role(elo, role_ranges))
+            if role is not None:
+                desired_roles[player_id] = role
+        desired_roles.update({player_id: None for player_id, *_ in n_players})
+        plans = plan_role_changes(members, desired_roles, league_roles.values())
+
+        last_shown = 0
+
+        async def show_progress(done, total):
+            nonlocal last_shown
+            progress = int(done / total * 100)
+            if progress - last_shown >= 10:
+                last_shown = progress
+                await progress_msg.edit(content=f"Updating roles... {progress}%")
 
-        for i, (player_id, elo) in enumerate(players):
-            try:
-                member = await ctx.guild.fetch_member(player_id)
-                if not member:
-                    continue
-
-                new_role = None
-                for role_range in role_ranges:
-                    if role_range["min"] <= elo <= role_range["max"]:
-                        new_role = discord.utils.get(
-                            ctx.guild.roles, name=role_range["name"]
-                        )
-                        if not new_role:
-                            await ctx.send(
-                                f"⚠️ Role '{role_range['name']}' not found on server!"
-                            )
-                            continue
-                        break
-
-                if not new_role:
-                    continue
-
-                roles_to_remove = []
-                for role_range in role_ranges:
-                    existing_role = discord.utils.get(
-                        member.roles, name=role_range["name"]
-                    )
-                    if existing_role:
-                        roles_to_remove.append(existing_role)
-
-                if roles_to_remove:
-                    await member.remove_roles(*roles_to_remove)
-
-                await member.add_roles(new_role)
-                updated_count += 1
-
-                if (i + 1) % max(5, len(players) // 10) == 0:
-                    progress = int((i + 1) / len(players) * 100)
-                    await progress_msg.edit(content=f"Updating roles... {progress}%")
-
-            except discord.Forbidden:
-                await ctx.send("❌ Bot doesn't have permission to manage roles!")
-                return
-            except discord.HTTPException as e:
-                print(f"HTTP Error updating {player_id}: {e}")
-            except Exception as e:
-                print(f"Error updating {player_id}: {e}")
-
-        await progress_msg.edit(content=f"Updating Roles ... 100%")
-
-        n_players = find_unsigned_players()
-        update_missed_seasons()
-        for i, (player_id, elo, missed_seasons) in enumerate(n_players):
-            try:
-
-                member = await ctx.guild.fetch_member(player_id)
-                if not member:
-                    continue
-
-                punish_player(player_id, elo, missed_seasons)
-
-                roles_to_remove = []
-                for role_range in role_ranges:
-                    existing_role = discord.utils.get(
-                        member.roles, name=role_range["name"]
-                    )
-                    if existing_role:
-                        roles_to_remove.append(existing_role)
-
-                if roles_to_remove:
-                    await member.remove_roles(*roles_to_remove)
-
-                updated_count += 1
-
-                if (i + 1) % max(5, len(n_players) // 10) == 0:
-                    progress = int((i + 1) / len(n_players) * 100)
-                    await progress_msg.edit(content=f"Removing roles... {progress}%")
-
-            except discord.Forbidden:
-                await ctx.send("❌ Bot doesn't have permission to manage roles!")
-                return
-            except discord.HTTPException as e:
-                print(f"HTTP Error updating {player_id}: {e}")
-            except Exception as e:
-                print(f"Error updating {player_id}: {e}")
+        try:
+            stats = await apply_role_changes(plans, progress=show_progress)
+        except discord.Forbidden:
+            await ctx.send("❌ Bot doesn't have permission to manage roles!")
+            return
 
+        legacy_calls = legacy_call_count(desired_roles, members, league_roles.values())
+        saved = max(legacy_calls - stats["calls"], 0)
+        unchanged = sum(1 for player_id in desired_roles if player_id in members)
+        unchanged -= len(plans)
         await progress_msg.delete()
         await ctx.send(
-            f"✅ Successfully updated roles for {updated_count}/{len(players) + len(n_players)} registered players!"
+            f"✅ Updated roles for {stats['updated']} players, "
+            f"{unchanged} already had the right roles "
+            f"({len(players) + len(n_players)} registered, {len(members)} on the server).\n"
+            f"{stats['calls']} API calls, {saved} saved"
+            + (f", {stats['retries']} rate-limit retries" if stats["retries"] else "")
+            + (f", ❌ {stats['failed']} failed" if stats["failed"] else "")
         )
 
     except FileNotFoundError as e:
@@ -217,11 +221,11 @@ async def register_player(ctx):
         return
 
     player_id = ctx.author.id
-    if get_player_data(player_id):
+    if await get_player_data(player_id):
         await ctx.send(f"{ctx.author.mention}, you're already registered!")
         return
 
-    register_new_player(player_id)
+    await register_new_player(player_id, ctx.author.display_name)
 
     await ctx.send(
         f"🎉 {ctx.author.mention} has been registered with an initial ELO of {INITIAL_ELO}!"
@@ -248,14 +252,14 @@ async def report_match(ctx, result: str, opponent: discord.Member, game_number:
         return
 
     author_id = ctx.author.id
-    reporter_data = get_player_data(author_id)
-    opponent_data = get_player_data(opponent.id)
+    reporter_data = await get_player_data(author_id)
+    opponent_data = await get_player_data(opponent.id)
     if not reporter_data or not opponent_data:
         await ctx.send("❌ Both players must be registered!")
         return
     try:
-        game1, game2, p1_id, p2_id, new_rep = add_and_resolve_report(
-            author_id, opponent.id, game_number, result
+        game1, game2, p1_id, p2_id, new_rep, rating_changes = (
+            await add_and_resolve_report(author_id, opponent.id, game_number, result)
         )
     except Exception as e:
         match e.args[0]:
@@ -284,29 +288,8 @@ async def report_match(ctx, result: str, opponent: discord.Member, game_number:
             f"@{ctx.author.name} {game_number}`"
         )
         return
-    if game1 is not None and game2 is not None:
-        p1_elo = get_player_data(p1_id)[1]
-        p2_elo = get_player_data(p2_id)[1]
-
-        player1_new_stats, player2_new_stats = calculate_match_stats(
-            game1, game2, p1_elo, p2_elo
-        )
-
-        update_player_stats(
-            p1_id,
-            player1_new_stats["elo"],
-            player1_new_stats["wins"],
-            player1_new_stats["losses"],
-            player1_new_stats["draws"],
-        )
-        update_player_stats(
-            p2_id,
-            player2_new_stats["elo"],
-            player2_new_stats["wins"],
-            player2_new_stats["losses"],
-            player2_new_stats["draws"],
-        )
-
+    if rating_changes is not None:
+        (p1_elo, player1_new_stats), (p2_elo, player2_new_stats) = rating_changes
         await ctx.send(
             f"✅ Both games confirmed! Updated:\n"
             f"<@{p1_id}>: {player1_new_stats["wins"]}W {player1_new_stats["losses"]}L {player1_new_stats["draws"]}D | ELO: {p1_elo:.0f}→{player1_new_stats["elo"]:.0f}\n"
@@ -332,8 +315,8 @@ async def cancel_pending_match(ctx, result: str, opponent: discord.Member):
         await ctx.send("You can't cancel a match with yourself!")
         return
 
-    pairing = get_specific_pairing(ctx, opponent)
-    pending_rep = get_pending_rep(ctx.author.id, pairing[0])
+    pairing = await get_specific_pairing(ctx.author.id, opponent.id)
+    pending_rep = await get_pending_rep(ctx.author.id, pairing[0])
 
     if not pending_rep:
         await ctx.send(f"No pending match found against {opponent.mention} to cancel!")
@@ -345,7 +328,7 @@ async def cancel_pending_match(ctx, result: str, opponent: discord.Member):
         )
         return
 
-    delete_pending_rep(pending_rep[0])
+    await delete_pending_rep(pending_rep[0])
     await ctx.send(
         f"✅ Successfully canceled your pending match against {opponent.mention}!"
     )
@@ -359,7 +342,7 @@ async def show_stats(ctx, player: discord.Member = None):
         return
 
     target = player or ctx.author
-    data = get_player_data(target.id)
+    data = await get_player_data(target.id)
 
     if not data:
         if target == ctx.author:
@@ -386,17 +369,197 @@ async def show_stats(ctx, player: discord.Member = None):
     await ctx.send(embed=embed)
 
 
+@bot.command(name="history")
+async def show_history(ctx, player: discord.Member = None):
+    allowed, error_msg = check_channel(ctx)
+    if not allowed:
+        await ctx.send(error_msg)
+        return
+
+    target = player or ctx.author
+    history = await get_rating_history(target.id)
+    if not history:
+        await ctx.send(f"No rating history for {target.display_name} yet.")
+        return
+
+    ratings = [point["elo"] for point in history]
+    embed = discord.Embed(
+        title=f"Rating history for {target.display_name}", color=0x00FF00
+    )
+    embed.add_field(name="Current", value=f"{ratings[-1]:.0f}")
+    embed.add_field(name="Peak", value=f"{max(p['high'] for p in history):.0f}")
+    embed.add_field(name="Lowest", value=f"{min(p['low'] for p in history):.0f}")
+    step = max(1, len(history) // 8)
+    checkpoints = history[::step][:8]
+    if checkpoints[-1] is not history[-1]:
+        checkpoints[-1] = history[-1]
+    table = "\n".join(
+        f"{point['timestamp'][:10]}  {point['elo']:6.0f}" for point in checkpoints
+    )
+    embed.description = f"`{sparkline(ratings)}`\n```{table}```"
+    updates = sum(point["games"] for point in history)
+    embed.set_footer(
+        text=f"{updates} rating updates since {history[0]['timestamp'][:10]}"
+    )
+    await ctx.send(embed=embed)
+
+
+@bot.command(name="season_stats")
+async def show_season_stats(ctx, season: int = None):
+    allowed, error_msg = check_channel(ctx)
+    if not allowed:
+        await ctx.send(error_msg)
+        return
+
+    if season is None:
+        (season, _active) = await get_latest_season()
+    changes = await get_season_changes(season)
+    if not changes:
+        await ctx.send(f"❌ No rating snapshot for Season {season}!")
+        return
+
+    lines = []
+    for i, row in enumerate(changes[:10], start=1):
+        name = row["display_name"] or f"Player {row['player_id']}"
+        lines.append(
+            f"{i}. {name}: {row['start_elo']:.0f} → {row['elo']:.0f} "
+            f"({row['elo_change']:+.0f}) | "
+            f"{row['wins']}W {row['losses']}L {row['draws']}D"
+        )
+    for row in changes[10:]:
+        if row["player_id"] == ctx.author.id:
+            lines.append(
+                f"You: {row['start_elo']:.0f} → {row['elo']:.0f} "
+                f"({row['elo_change']:+.0f})"
+            )
+    embed = discord.Embed(
+        title=f"Rating changes - Season {season}",
+        description="\n".join(lines),
+        color=0x00FF00,
+    )
+    await ctx.send(embed=embed)
+
+
 @bot.command("backup")
 @commands.has_permissions(manage_roles=True)
-async def backup_db(ctx):
+async def backup_db(ctx, mode: str = None):
     if BACKUP_CHANNEL_ID is None:
         await ctx.send("❌ Backup channel isn't setuped yet")
         return
     channel = bot.get_channel(BACKUP_CHANNEL_ID)
+    if mode == "delta":
+        path = await create_delta_backup()
+    else:
+        path = await create_backup()
     await channel.send(
         f"BackUP: <t:{math.floor(datetime.now().timestamp())}>",
-        file=discord.File(SQLITEFILE),
+        file=discord.File(path),
+    )
+
+
+@bot.command(name="rebuild_standings")
+@commands.has_permissions(manage_roles=True)
+async def rebuild_standings_command(ctx):
+    allowed, error_msg = check_channel(ctx)
+    if not allowed:
+        await ctx.send(error_msg)
+        return
+
+    try:
+        rows, inconsistent = await rebuild_standings()
+    except Exception as e:
+        await ctx.send(f"❌ Error rebuilding standings: {e}")
+        return
+    await ctx.send(
+        f"✅ Rebuilt standings from match history: {rows} rows, {inconsistent} inconsistent rows fixed."
+    )
+
+
+@bot.command(name="replay")
+@commands.has_permissions(manage_roles=True)
+async def replay_ratings(ctx, mode: str = None):
+    allowed, error_msg = check_channel(ctx)
+    if not allowed:
+        await ctx.send(error_msg)
+        return
+
+    try:
+        result = await replay_history()
+        diffs = await diff_against_players(result)
+    except Exception as e:
+        await ctx.send(f"❌ Error replaying match history: {e}")
+        return
+
+    lines = []
+    for diff in diffs[:10]:
+        live, replayed = diff["live"], diff["replay"]
+        lines.append(
+            f"<@{diff['id']}>: {live['elo']:.0f}→{replayed['elo']:.0f} | "
+            f"{live['wins']}W {live['losses']}L {live['draws']}D→"
+            f"{replayed['wins']}W {replayed['losses']}L {replayed['draws']}D"
+        )
+    summary = (
+        f"🔁 Replayed {len(result['history']) // 2} rated pairings: "
+        f"{len(diffs)} players differ from the live table."
     )
+    if lines:
+        summary += "\n" + "\n".join(lines)
+        if len(diffs) > len(lines):
+            summary += f"\n… and {len(diffs) - len(lines)} more"
+
+    if mode == "apply":
+        await apply_replay(result)
+        summary += "\n✅ Replayed ratings, W/L/D and elo history applied."
+    elif diffs:
+        summary += "\nRun `$replay apply` to overwrite the live ratings."
+    await ctx.send(summary)
+
+
+@bot.command(name="perf")
+@commands.has_permissions(manage_roles=True)
+async def show_perf(ctx):
+    allowed, error_msg = check_channel(ctx)
+    if not allowed:
+        await ctx.send(error_msg)
+        return
+
+    uptime = datetime.now().timestamp() - perf.started
+    lines = [f"Since <t:{math.floor(perf.started)}:R> ({uptime / 3600:.1f}h)", "```"]
+    lines.append(
+        f"{'command':<18}{'calls':>6}{'err':>5}{'p50':>8}{'p95':>8}{'p99':>8}{'sql':>7}"
+    )
+    for entry in perf.command_report():
+        lines.append(
+            f"{entry['command'][:17]:<18}{entry['calls']:>6}{entry['errors']:>5}"
+            f"{entry['p50'] * 1000:>6.0f}ms{entry['p95'] * 1000:>6.0f}ms"
+            f"{entry['p99'] * 1000:>6.0f}ms{entry['sql_share']:>7.0%}"
+        )
+    lines.append("```")
+
+    slowest = perf.slowest_queries()
+    if slowest:
+        lines.append("**Slowest queries**")
+        for query in slowest[:5]:
+            lines.append(
+                f"`{query['seconds'] * 1000:.1f}ms` {query['command'] or 'background'}: "
+                f"`{query['sql'][:120]}`"
+            )
+
+    busiest = perf.query_report(limit=3)
+    if busiest:
+        lines.append("**Most total SQL time**")
+        for query in busiest:
+            lines.append(
+                f"`{query['total'] * 1000:.0f}ms` over {query['count']} runs: "
+                f"`{query['sql'][:120]}`"
+            )
+
+    cache = leaderboard_cache_stats()
+    lines.append(
+        f"Leaderboard cache: {cache['hits']} hits, {cache['misses']} misses, "
+        f"{cache['invalidations']} invalidations"
+    )
+    await ctx.send("\n".join(lines)[:2000])
 
 
 @bot.command(name="leaderboard")
@@ -409,6 +572,11 @@ async def show_leaderboard(ctx, *args):
     # 1️⃣ parse args
     limit = 10
     role_name = None
+    season = None
+    if len(args) >= 2 and args[0].lower() == "season" and args[1].isdigit():
+        season, boundary, args = int(args[1]), "start", args[2:]
+        if args and args[0].lower() in ("start", "end"):
+            boundary, args = args[0].lower(), args[1:]
     for arg in args:
         if arg.isdigit():
             limit = min(max(1, int(arg)), 25)
@@ -427,40 +595,30 @@ async def show_leaderboard(ctx, *args):
         if not member_ids:
             return await ctx.send(f"❌ No players have the '{role.name}' role!")
 
-    total_players, you, user_rank, surrounding, rows = await bundle_leaderboard(
-        ctx.author.id, limit, member_ids
-    )
+    if season is None:
+        bundle = await bundle_leaderboard(ctx.author.id, limit, member_ids)
+    else:
+        bundle = await bundle_season_leaderboard(
+            season, boundary, ctx.author.id, limit, member_ids
+        )
+    total_players, you, user_rank, surrounding, rows = bundle
 
     if not rows and not surrounding:
+        if season is not None:
+            return await ctx.send(
+                f"❌ No {boundary} snapshot found for season {season}!"
+            )
         msg = "❌ No players found"
         if role:
             msg += f" with the '{role.name}' role"
         return await ctx.send(msg + "! Use `$register` to join.")
 
-    # 4️⃣ bulk‑resolve all needed Discord names
-    all_ids = {r["id"] for r in rows} | {r["id"] for r in surrounding}
-    names = {}
-    # try cache first
-    for uid in all_ids:
-        m = ctx.guild.get_member(uid)
-        if m:
-            names[uid] = m.display_name[:20]
-    missing = [uid for uid in all_ids if uid not in names]
-    if missing:
-        fetched = await asyncio.gather(
-            *(ctx.guild.fetch_member(uid) for uid in missing), return_exceptions=True
-        )
-        for res in fetched:
-            if isinstance(res, discord.Member):
-                names[res.id] = res.display_name[:20]
-            else:
-                bad = getattr(res, "user_id", None)
-                names[bad] = f"Player {bad}"
-
     # 5️⃣ build embed
     title = f"🏆 Top {limit} Leaderboard"
     if role:
         title += f" ({role.name})"
+    if season is not None:
+        title += f" - Season {season} {boundary}"
     title += f" 🏆"
 
     embed = discord.Embed(title=title, color=role.color if role else 0xFFD700)
@@ -469,7 +627,7 @@ async def show_leaderboard(ctx, *args):
     # Top section
     for idx, r in enumerate(rows, start=1):
         pid, elo, w, l, d = r["id"], r["elo"], r["wins"], r["losses"], r["draws"]
-        name = names.get(pid, f"Player {pid}")
+        name = (r["display_name"] or f"Player {pid}")[:20]
         if role and role in ctx.guild.get_member(pid).roles:
             name += f" {role.mention}"
 
@@ -492,7 +650,7 @@ async def show_leaderboard(ctx, *args):
             if idx in displayed:
                 continue
             pid, elo, w, l, d = r["id"], r["elo"], r["wins"], r["losses"], r["draws"]
-            name = names.get(pid, f"Player {pid}")
+            name = (r["display_name"] or f"Player {pid}")[:20]
             prefix = "**>>>** " if pid == ctx.author.id else ""
             if role and role in ctx.guild.get_member(pid).roles:
                 name += f" {role.mention}"
@@ -524,18 +682,34 @@ async def signup_player(ctx):
         return
 
     player_id = ctx.author.id
-    if not get_player_data(player_id):
+    if not await get_player_data(player_id):
         await ctx.send(f"You need to register first with `$register`!")
         return
-    (_, season_active) = get_latest_season()
+    (_, season_active) = await get_latest_season()
 
     if not season_active:
-        sign_up_player(player_id)
+        await sign_up_player(player_id)
         await ctx.send(f"✅ {ctx.author.mention} has signed up for the current season!")
     else:
         await ctx.send("❌ Season is already active")
 
 
+@bot.command(name="preview_pairings")
+@commands.has_permissions(manage_roles=True)
+async def preview_pairings(ctx):
+    allowed, error_msg = check_channel(ctx)
+    if not allowed:
+        await ctx.send(error_msg)
+        return
+
+    (current_season, active) = await get_latest_season()
+    if active:
+        await ctx.send("❌ There's already an active season!")
+        return
+
+    await generate_pairings(ctx, current_season, dry_run=True)
+
+
 @bot.command(name="start_season")
 @commands.has_permissions(manage_roles=True)
 async def start_season(ctx):
@@ -546,7 +720,7 @@ async def start_season(ctx):
 
     try:
 
-        (current_season, active) = get_latest_season()
+        (current_season, active) = await get_latest_season()
 
         if active:
             await ctx.send("❌ There's already an active season!")
@@ -556,7 +730,7 @@ async def start_season(ctx):
 
         await generate_pairings(ctx, current_season)
 
-        activate_season(current_season)
+        await activate_season(current_season)
 
         await ctx.send(
             f"✅ Season {current_season} has started! Players can no longer sign up"
@@ -576,14 +750,14 @@ async def end_season(ctx):
 
     try:
 
-        (old_season, _) = get_latest_season()
+        (old_season, _) = await get_latest_season()
 
         if not old_season:
             await ctx.send("❌ No active season to end!")
             return
 
         new_season = old_season + 1
-        setup_future_season(old_season, new_season)
+        await setup_future_season(old_season, new_season)
         await ctx.send(
             f"✅ Season {old_season} has ended. Season {new_season} is ready to start!"
         )
@@ -629,10 +803,13 @@ async def show_help(ctx):
         value=(
             "`$stats` - Show your stats\n"
             "`$stats @player` - Show another player's stats\n"
+            "`$history [@player]` - Show a player's rating over time\n"
+            "`$season_stats [season number]` - Show rating changes over a season\n"
             "`$leaderboard` - Show top 10 players\n"
             "`$leaderboard [number]` - Show top X players (max 25)\n"
             "`$leaderboard [role name]` - Show leaderboard for a specific role\n"
             "`$leaderboard [number] [role name]` - Combined options\n"
+            "`$leaderboard season [season number] [start|end]` - Leaderboard as it stood when a season started or ended, takes the same options\n"
             "`$rankings [group name]` - shows the current rankings of the group you are requesting\n"
             "`$rankings [group name] [season number]` - Shows the Rankings of the Specific Season"
         ),
@@ -654,8 +831,12 @@ async def show_help(ctx):
             name="🔹 Admin Commands",
             value=(
                 "`$update_roles` - Update all signed-up players' roles based on ELO\n"
+                "`$preview_pairings` - Dry run of the next season's pairings\n"
                 "`$start_season` - Start a new season (generates pairings)\n"
                 "`$end_season` - End the current season\n"
+                "`$rebuild_standings` - Recompute group standings from match history\n"
+                "`$replay [apply]` - Recompute all ratings from match history\n"
+                "`$perf` - Command latency and slowest queries since startup\n"
                 "   • Requires a properly configured 'elo_roles.csv' file"
             ),
             inline=False,
@@ -687,19 +868,65 @@ async def show_help(ctx):
     await ctx.send(embed=embed)
 
 
+def render_pairings_page(season, rows, page, first_match):
+    desc = ""
+    for i, r in enumerate(rows, start=first_match):
+        p1 = (r["player1_name"] or f"Player {r['player1_id']}")[:20]
+        p2 = (r["player2_name"] or f"Player {r['player2_id']}")[:20]
+        res1 = f"{r['result1']:.1f}" if r["result1"] is not None else "Pending"
+        res2 = f"{r['result2']:.1f}" if r["result2"] is not None else "Pending"
+        desc += (
+            f"**Match {i}**\n"
+            f"⚔ {p1} vs {p2}\n"
+            f"• Game 1: {res1.ljust(7)} • Game 2: {res2}\n\n"
+        )
+    return discord.Embed(
+        title=f"Pairings - Season {season} — Page {page + 1}",
+        description=desc,
+        color=0x00FF00,
+    )
+
+
 class PairingsPaginator(discord.ui.View):
-    def __init__(self, embeds, author):
+    def __init__(self, group_id, season, total, author):
         super().__init__(timeout=60)
-        self.embeds = embeds
+        self.group_id = group_id
+        self.season = season
+        self.pages = max(1, math.ceil(total / PAIRINGS_PER_PAGE))
+        # Last pairing id before each page, filled in as pages are visited.
+        self.cursors = [0]
+        self.embeds = LRUCache(max_entries=PAIRINGS_CACHED_PAGES)
         self.current_page = 0
         self.author = author
         self.message = None
         self._update_buttons()
 
+    async def get_page(self, page):
+        embed = self.embeds.get(page)
+        if embed is not None:
+            return embed
+        rows = await get_pairings_page(
+            self.group_id, self.cursors[page], PAIRINGS_PER_PAGE
+        )
+        if rows and len(self.cursors) == page + 1:
+            self.cursors.append(rows[-1]["id"])
+        embed = render_pairings_page(
+            self.season, rows, page, page * PAIRINGS_PER_PAGE + 1
+        )
+        self.embeds.put(page, embed)
+        return embed
+
     def _update_buttons(self):
         self.previous_button.disabled = self.current_page == 0
-        self.next_button.disabled = self.current_page == len(self.embeds) - 1
-        self.page_count.label = f"Page {self.current_page + 1}/{len(self.embeds)}"
+        self.next_button.disabled = self.current_page == self.pages - 1
+        self.page_count.label = f"Page {self.current_page + 1}/{self.pages}"
+
+    async def _show(self, interaction, page):
+        self.current_page = page
+        self._update_buttons()
+        await interaction.response.edit_message(
+            embed=await self.get_page(page), view=self
+        )
 
     @discord.ui.button(label="◀", style=discord.ButtonStyle.blurple)
     async def previous_button(
@@ -707,11 +934,7 @@ class PairingsPaginator(discord.ui.View):
     ):
         if interaction.user != self.author:
             return
-        self.current_page -= 1
-        self._update_buttons()
-        await interaction.response.edit_message(
-            embed=self.embeds[self.current_page], view=self
-        )
+        await self._show(interaction, self.current_page - 1)
 
     @discord.ui.button(label="Page 1/1", style=discord.ButtonStyle.grey, disabled=True)
     async def page_count(
@@ -725,11 +948,7 @@ class PairingsPaginator(discord.ui.View):
     ):
         if interaction.user != self.author:
             return
-        self.current_page += 1
-        self._update_buttons()
-        await interaction.response.edit_message(
-            embed=self.embeds[self.current_page], view=self
-        )
+        await self._show(interaction, self.current_page + 1)
 
     async def on_timeout(self):
         for item in self.children:
@@ -744,15 +963,13 @@ async def show_groupleaderboard(ctx, group="own", season="latest"):
         await ctx.send(error_msg)
         return
     if season == "latest":
-        (season, _active) = get_latest_season()
+        (season, _active) = await get_latest_season()
     if group == "own":
-        group = find_player_group(ctx.author.id, season)
-    if "procrastination" in group.lower() or "lazy" in group.lower():
-        group = "Pro League"
+        group = await find_player_group(ctx.author.id, season)
     if not group:
         await ctx.send(f"❌ Couldnt find your given Group in {season}")
         return
-    leaderboard = get_group_ranking(season, group)
+    leaderboard = await get_group_ranking(season, group)
 
     if "advanced" in group.lower():
         color = discord.Color.yellow()
@@ -769,17 +986,13 @@ async def show_groupleaderboard(ctx, group="own", season="latest"):
     embed_str = ""
     for i, player in enumerate(leaderboard, 1):
         id = player["id"]
-        try:
-            member = await ctx.guild.fetch_member(id)
-            name = member.display_name[:20]
-        except discord.NotFound:
-            name = "Player left Server"
+        name = (player["name"] or "Player left Server")[:20]
 
         if ctx.author.id == id:
-            embed_str += f"**{i}. {name}, Score: {player['points']}, {player['sb']}**"
+            embed_str += f"**{i}. {name}, Score: {player['points']:g}, {player['sb']}**"
 
         else:
-            embed_str += f"{i}. {name}, Score: {player['points']}, {player['sb']}\n"
+            embed_str += f"{i}. {name}, Score: {player['points']:g}, {player['sb']}\n"
 
     embed.add_field(name="", value=embed_str)
     await ctx.send(embed=embed)
@@ -809,7 +1022,9 @@ async def show_pairings(ctx, *, args: str = None):
         group_name = None
 
     try:
-        pairings, season = find_pairings_in_db(ctx.player.id, season, group_name)
+        group_id, season, total = await find_pairings_in_db(
+            ctx.author.id, season, group_name
+        )
     except Exception as e:
         (errorcode,) = e.args
         match errorcode:
@@ -825,60 +1040,31 @@ async def show_pairings(ctx, *, args: str = None):
             case _:
                 await ctx.send(errorcode)
                 return
-    if not pairings:
+    if not total:
         suffix = f", Group {group_name}" if group_name else ""
         await ctx.send(f"❌ No pairings found for Season {season}{suffix}!")
         return
 
-    ids = {row["player1_id"] for row in pairings} | {
-        row["player2_id"] for row in pairings
-    }
-    names = {}
-    for uid in ids:
-        m = ctx.guild.get_member(uid)
-        if m:
-            names[uid] = m.display_name[:20]
-    missing = [uid for uid in ids if uid not in names]
-    if missing:
-        fetched = await asyncio.gather(
-            *(ctx.guild.fetch_member(uid) for uid in missing), return_exceptions=True
-        )
-        for res in fetched:
-            if isinstance(res, discord.Member):
-                names[res.id] = res.display_name[:20]
-            else:
-                bad_id = getattr(res, "user_id", None) or None
-                names[bad_id] = f"Player {bad_id}"
-
-    MAX_CHARS = 3800
-    pages, desc = [], ""
-    for i, r in enumerate(pairings, start=1):
-        p1, p2 = r["player1_id"], r["player2_id"]
-        res1 = f"{r['result1']:.1f}" if r["result1"] is not None else "Pending"
-        res2 = f"{r['result2']:.1f}" if r["result2"] is not None else "Pending"
-        entry = (
-            f"**Match {i}**\n"
-            f"⚔ {names[p1]} vs {names[p2]}\n"
-            f"• Game 1: {res1.ljust(7)} • Game 2: {res2}\n\n"
-        )
-        if len(desc) + len(entry) > MAX_CHARS:
-            pages.append(desc)
-            desc = entry
-        else:
-            desc += entry
-    if desc:
-        pages.append(desc)
-    title = f"Pairings - Season {season}"
-    embeds = [
-        discord.Embed(title=f"{title} — Page {idx+1}", description=page, color=0x00FF00)
-        for idx, page in enumerate(pages)
-    ]
-
-    if len(embeds) == 1:
-        await ctx.send(embed=embeds[0])
+    view = PairingsPaginator(group_id, season, total, ctx.author)
+    embed = await view.get_page(0)
+    if view.pages == 1:
+        await ctx.send(embed=embed)
     else:
-        view = PairingsPaginator(embeds, ctx.author)
-        view.message = await ctx.send(embed=embeds[0], view=view)
+        view.message = await ctx.send(embed=embed, view=view)
+
+
+async def notify_expired_report(rep):
+    channel = bot.get_channel(ALLOWED_CHANNEL_ID)
+    if channel is None:
+        return
+    opponent_id = rep["player2_id"]
+    if rep["reporter_id"] == opponent_id:
+        opponent_id = rep["player1_id"]
+    await channel.send(
+        f"⌛ <@{rep['reporter_id']}> your report of game {rep['game_number']} "
+        f"against <@{opponent_id}> expired after {PENDING_REP_MINUTES} minutes "
+        f"without confirmation. Report it again with `$rep`."
+    )
 
 
 @bot.event
@@ -886,7 +1072,46 @@ async def on_ready():
     print(f"Logged in as {bot.user.name} ({bot.user.id})")
     print(f"Commands restricted to channel ID: {ALLOWED_CHANNEL_ID}")
     print("------")
-    bot.loop.create_task(clean_old_pending_matches())
+    start_pending_expiry(notify_expired_report)
+    backfilled = await backfill_standings()
+    if backfilled:
+        print(f"Backfilled standings: {backfilled[0]} rows")
+    renamed = await sync_display_names(
+        (member.id, member.display_name)
+        for guild in bot.guilds
+        for member in guild.members
+    )
+    if renamed:
+        print(f"Refreshed {renamed} player display names")
+
+
+@bot.event
+async def on_member_join(member):
+    await update_display_names([(member.id, member.display_name)])
+
+
+@bot.event
+async def on_member_update(before, after):
+    if before.display_name != after.display_name:
+        await update_display_names([(after.id, after.display_name)])
+
+
+@bot.event
+async def on_user_update(before, after):
+    if before.display_name == after.display_name:
+        return
+    names = []
+    for guild in bot.guilds:
+        member = guild.get_member(after.id)
+        if member is not None:
+            names.append((member.id, member.display_name))
+    if names:
+        await update_display_names(names)
+
+
+@bot.event
+async def on_member_remove(member):
+    await update_display_names([(member.id, None)])
 
 
 @bot.event
@@ -895,6 +1120,9 @@ async def on_command_error(ctx, error):
         return
     if isinstance(error, commands.CheckFailure):
         return
+    # Errors raised inside the command body are counted by the after_invoke hook.
+    if ctx.command is not None and not isinstance(error, commands.CommandInvokeError):
+        perf.record_error(ctx.command.qualified_name)
     print(f"Error in command {ctx.command}: {error}")
 
 
@@ -2,6 +2,33 @@ ROLES_CONFIG_FILE = "elo_roles.csv"
 SQLITEFILE = "elo_bot.db"
 K_FACTOR = 25
 INITIAL_ELO = 1380
+INACTIVITY_PENALTY = 10
+PENDING_REP_MINUTES = 30
+BACKUP_RETENTION = 14
+BACKUP_PAGES_PER_STEP = 256
+PAIRINGS_PER_PAGE = 30
+PAIRINGS_CACHED_PAGES = 4
+HISTORY_MAX_POINTS = 200
+
+# Connection profiles applied to every SQLite connection, picked with the
+# sqlite_profile setting in config.csv. "default" leaves SQLite's defaults.
+SQLITE_PROFILES = {
+    "default": {},
+    "wal": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "busy_timeout": 5000,
+        "mmap_size": 268435456,
+        "cache_size": -65536,
+    },
+    "durable": {
+        "journal_mode": "WAL",
+        "synchronous": "FULL",
+        "busy_timeout": 5000,
+        "cache_size": -16384,
+    },
+}
+DEFAULT_SQLITE_PROFILE = "wal"
 
 DATABASE_STRUCTURE = {
     "pairings": [
@@ -12,6 +39,7 @@ DATABASE_STRUCTURE = {
         "result2",
         "season_number",
         "group_name",
+        "group_id",
     ],
     "pending_reps": [
         "id",
@@ -21,7 +49,16 @@ DATABASE_STRUCTURE = {
         "game_number",
         "timestamp",
     ],
-    "players": ["id", "elo", "wins", "losses", "draws", "signed_up", "seasons_missed"],
+    "players": [
+        "id",
+        "elo",
+        "wins",
+        "losses",
+        "draws",
+        "signed_up",
+        "seasons_missed",
+        "display_name",
+    ],
     "seasons": ["season_number", "active"],
     "match_history": [
         "match",
@@ -30,9 +67,43 @@ DATABASE_STRUCTURE = {
         "colorwon",
         "season",
         "league",
+        "season_number",
+        "group_key",
     ],
     "elo_history": ["id", "player_id", "elo_change", "timestamp"],
     "player_aliases": ["id", "player_id", "alias"],
+    "standings": [
+        "id",
+        "season_number",
+        "group_key",
+        "player_id",
+        "points",
+        "games_played",
+        "wonagainst",
+    ],
+    "groups": ["id", "season_number", "name", "group_key"],
+    "group_aliases": ["id", "alias", "group_key"],
+    "season_snapshots": [
+        "id",
+        "season_number",
+        "boundary",
+        "player_id",
+        "elo",
+        "wins",
+        "losses",
+        "draws",
+        "role",
+        "signed_up",
+    ],
+    "penalties": ["id", "player_id", "amount", "floor", "after_match", "timestamp"],
+}
+
+# Alternative names players use for a group, by canonical key.
+DEFAULT_GROUP_ALIASES = {
+    "procrastination": "pro league",
+    "procrastination league": "pro league",
+    "lazy": "pro league",
+    "lazy league": "pro league",
 }
 
 DATABASE_STRUCTURE_CREATIONSTRINGMAPPING = {
@@ -44,6 +115,25 @@ DATABASE_STRUCTURE_CREATIONSTRINGMAPPING = {
         "match_history": "match INTEGER PRIMARY KEY AUTOINCREMENT",
         "elo_history": "id INTEGER PRIMARY KEY AUTOINCREMENT",
         "player_aliases": "id INTEGER PRIMARY KEY AUTOINCREMENT",
+        "standings": "id INTEGER PRIMARY KEY AUTOINCREMENT",
+        "groups": "id INTEGER PRIMARY KEY AUTOINCREMENT",
+        "group_aliases": "id INTEGER PRIMARY KEY AUTOINCREMENT",
+        "season_snapshots": "id INTEGER PRIMARY KEY AUTOINCREMENT",
+        "penalties": "id INTEGER PRIMARY KEY AUTOINCREMENT",
+    },
+    "Indexes": {
+        "idx_pairings_season_players": "pairings (season_number, player1_id, player2_id)",
+        "idx_pairings_season_player2": "pairings (season_number, player2_id)",
+        "idx_pairings_group": "pairings (group_id)",
+        "idx_pending_reps_pairing_game": "pending_reps (pairing_id, game_number)",
+        "idx_pending_reps_timestamp": "pending_reps (timestamp)",
+        "idx_match_history_season_white": "match_history (season_number, whiteplayer)",
+        "idx_match_history_season_black": "match_history (season_number, blackplayer)",
+        "idx_match_history_season_group": "match_history (season_number, group_key)",
+        "idx_elo_history_player_timestamp": "elo_history (player_id, timestamp)",
+        "idx_standings_season_group_player": "UNIQUE standings (season_number, group_key, player_id)",
+        "idx_groups_season_key": "UNIQUE groups (season_number, group_key)",
+        "idx_season_snapshots_season_player": "UNIQUE season_snapshots (season_number, boundary, player_id)",
     },
     "players": {
         "elo": "REAL DEFAULT 1380",
@@ -52,6 +142,7 @@ DATABASE_STRUCTURE_CREATIONSTRINGMAPPING = {
         "draws": "INTEGER DEFAULT 0",
         "signed_up": "INTEGER DEFAULT 0",
         "seasons_missed": "INTEGER DEFAULT 0",
+        "display_name": "TEXT",
     },
     "pairings": {
         "player1_id": "INTEGER",
@@ -60,6 +151,7 @@ DATABASE_STRUCTURE_CREATIONSTRINGMAPPING = {
         "result2": "REAL DEFAULT null",
         "season_number": "INTEGER",
         "group_name": "TEXT",
+        "group_id": "INTEGER",
         "foreignkeyconstraint": """
                 FOREIGN KEY
                 (
@@ -106,6 +198,8 @@ DATABASE_STRUCTURE_CREATIONSTRINGMAPPING = {
         "colorwon": "TEXT",
         "season": "TEXT",
         "league": "TEXT",
+        "season_number": "INTEGER",
+        "group_key": "TEXT",
         "foreignkeyconstraint": """
                 FOREIGN KEY
                 (
@@ -147,4 +241,63 @@ DATABASE_STRUCTURE_CREATIONSTRINGMAPPING = {
                     id
                 )""",
     },
+    "standings": {
+        "season_number": "INTEGER",
+        "group_key": "TEXT",
+        "player_id": "INTEGER",
+        "points": "REAL DEFAULT 0",
+        "games_played": "INTEGER DEFAULT 0",
+        "wonagainst": "TEXT DEFAULT ''",
+        "foreignkeyconstraint": """
+                FOREIGN KEY
+                (
+                    player_id
+                ) REFERENCES players
+                (
+                    id
+                )""",
+    },
+    "groups": {
+        "season_number": "INTEGER",
+        "name": "TEXT",
+        "group_key": "TEXT",
+    },
+    "group_aliases": {
+        "alias": "TEXT UNIQUE",
+        "group_key": "TEXT",
+    },
+    "season_snapshots": {
+        "season_number": "INTEGER",
+        "boundary": "TEXT",
+        "player_id": "INTEGER",
+        "elo": "REAL",
+        "wins": "INTEGER",
+        "losses": "INTEGER",
+        "draws": "INTEGER",
+        "role": "TEXT",
+        "signed_up": "INTEGER",
+        "foreignkeyconstraint": """
+                FOREIGN KEY
+                (
+                    player_id
+                ) REFERENCES players
+                (
+                    id
+                )""",
+    },
+    "penalties": {
+        "player_id": "INTEGER",
+        "amount": "REAL",
+        "floor": "REAL",
+        "after_match": "INTEGER",
+        "timestamp": "DATETIME DEFAULT CURRENT_TIMESTAMP",
+        "foreignkeyconstraint": """
+                FOREIGN KEY
+                (
+                    player_id
+                ) REFERENCES players
+                (
+                    id
+                )""",
+    },
 }
@@ -1,282 +1,480 @@
-import asyncio, sqlite3
-from datetime import datetime, timedelta
+import asyncio
+import heapq
+from datetime import datetime, timedelta, timezone
 
-import aiosqlite
 from constants import (
+    HISTORY_MAX_POINTS,
+    INACTIVITY_PENALTY,
     INITIAL_ELO,
-    SQLITEFILE,
+    PAIRINGS_PER_PAGE,
+    PENDING_REP_MINUTES,
 )
-from logic import calculate_sb, get_role_ranges, group_players
+from database_connection import (
+    execute,
+    executemany,
+    fetch_all,
+    fetch_one,
+    on_rollback,
+    transaction,
+)
+from leaderboard_index import EloIndex, LeaderboardCache, LRUCache
+from logic import (
+    calculate_match_stats,
+    calculate_sb,
+    canonical_group_key,
+    get_role_ranges,
+    penalised_elo,
+    plan_pairings,
+    plan_subgroups,
+)
+
+INDEX_COLUMNS = "id, elo, wins, losses, draws, display_name"
+
+_elo_index = None
+_leaderboard_cache = LeaderboardCache()
+_role_subset_cache = LeaderboardCache(max_entries=16)
+_history_cache = LRUCache(max_entries=128)
+_history_versions = {}
+_group_aliases = None
+_groups = {}
+_expiry_heap = []
+_expiry_wakeup = None
+_expiry_task = None
+
+
+async def get_elo_index():
+    global _elo_index
+    if _elo_index is None:
+        async with transaction():
+            if _elo_index is None:
+                _elo_index = EloIndex(
+                    await fetch_all(f"SELECT {INDEX_COLUMNS} FROM players")
+                )
+    return _elo_index
 
 
-def delete_pending_rep(rep_id):
+def _reset_elo_index():
+    global _elo_index
+    _elo_index = None
 
-    conn = sqlite3.connect(SQLITEFILE)
-    c = conn.cursor()
-    c.execute("DELETE FROM pending_reps WHERE id=?", (rep_id,))
-    conn.commit()
-    conn.close()
 
+def leaderboard_cache_stats():
+    return _leaderboard_cache.stats()
 
-def update_player_stats(player_id, elo, wins=0, losses=0, draws=0):
-    conn = sqlite3.connect(SQLITEFILE)
-    c = conn.cursor()
-    c.execute(
-        "INSERT INTO elo_history (player_id, elo_change) VALUES (?,?)",
-        (player_id, elo),
-    )
-    c.execute(
-        """UPDATE players
-                 SET elo=?,
-                     wins=wins + ?,
-                     losses=losses + ?,
-                     draws=draws + ?
-                 WHERE id = ?""",
-        (elo, wins, losses, draws, player_id),
+
+def _invalidate_leaderboard_cache():
+    _leaderboard_cache.clear()
+    _role_subset_cache.clear()
+
+
+def invalidate_rating_caches():
+    _reset_elo_index()
+    _invalidate_leaderboard_cache()
+    _history_cache.clear()
+
+
+def _bump_history_version(player_id):
+    # Cached series are keyed by this, so the next read recomputes them.
+    _history_versions[player_id] = _history_versions.get(player_id, 0) + 1
+
+
+async def _sync_elo_index(player_id):
+    _invalidate_leaderboard_cache()
+    on_rollback(_invalidate_leaderboard_cache)
+    if _elo_index is None:
+        return
+    on_rollback(_reset_elo_index)
+    row = await fetch_one(
+        f"SELECT {INDEX_COLUMNS} FROM players WHERE id=?", (player_id,)
     )
+    if row:
+        _elo_index.upsert(row)
+    else:
+        _elo_index.remove(player_id)
 
-    conn.commit()
-    conn.close()
 
+async def _canonical_group(name):
+    global _group_aliases
+    if _group_aliases is None:
+        _group_aliases = {
+            row["alias"]: row["group_key"]
+            for row in await fetch_all("SELECT alias, group_key FROM group_aliases")
+        }
+    key = canonical_group_key(name)
+    if key in _group_aliases:
+        return _group_aliases[key]
+    # Subgroups carry a "-N" suffix, the alias names the group before it.
+    base, dash, number = key.rpartition("-")
+    if dash and number.isdigit() and base in _group_aliases:
+        return f"{_group_aliases[base]}-{number}"
+    return key
+
+
+async def resolve_group(season, name):
+    key = (season, await _canonical_group(name))
+    group = _groups.get(key)
+    if group is None:
+        row = await fetch_one(
+            """SELECT id, name, group_key FROM groups
+                 WHERE season_number = ? AND group_key = ?""",
+            key,
+        )
+        if row is None:
+            return None
+        group = _groups[key] = dict(row)
+    return group
 
-def get_player_data(player_id):
-    conn = sqlite3.connect(SQLITEFILE)
-    c = conn.cursor()
-    c.execute("SELECT * FROM players WHERE id=?", (player_id,))
-    player = c.fetchone()
-    conn.close()
-    return player
 
+def _forget_groups():
+    _groups.clear()
 
-async def clean_old_pending_matches():
-    while True:
-        try:
-            conn = sqlite3.connect(SQLITEFILE)
-            c = conn.cursor()
-            cutoff_time = datetime.now() - timedelta(minutes=30)
-            cutoff_str = cutoff_time.strftime("%Y-%m-%d %H:%M:%S")
-            c.execute("DELETE FROM pending_reps WHERE timestamp < ?", (cutoff_str,))
-            deleted_count = c.rowcount
-            conn.commit()
-            if deleted_count > 0:
-                print(f"Cleaned up {deleted_count} old pending matches")
-            conn.close()
-        except Exception as e:
-            print(f"Error cleaning pending matches: {e}")
-        await asyncio.sleep(1800)
 
+async def _create_groups(season, names):
+    await executemany(
+        """INSERT OR IGNORE INTO groups (season_number, name, group_key)
+                 VALUES (?, ?, ?)""",
+        [(season, name, canonical_group_key(name)) for name in names],
+    )
+    on_rollback(_forget_groups)
+    return {name: (await resolve_group(season, name))["id"] for name in names}
 
-async def generate_pairings(ctx, season_number):
-    try:
-        conn = sqlite3.connect(SQLITEFILE)
-        c = conn.cursor()
 
-        c.execute(
-            """SELECT id, elo
-                     FROM players
-                     WHERE signed_up = 1"""
+async def delete_pending_rep(rep_id):
+    async with transaction():
+        await execute("DELETE FROM pending_reps WHERE id=?", (rep_id,))
+
+
+async def update_player_stats(player_id, elo, wins=0, losses=0, draws=0):
+    async with transaction():
+        await execute(
+            "INSERT INTO elo_history (player_id, elo_change) VALUES (?,?)",
+            (player_id, elo),
+        )
+        await execute(
+            """UPDATE players
+                     SET elo=?,
+                         wins=wins + ?,
+                         losses=losses + ?,
+                         draws=draws + ?
+                     WHERE id = ?""",
+            (elo, wins, losses, draws, player_id),
+        )
+        _bump_history_version(player_id)
+        on_rollback(lambda: _bump_history_version(player_id))
+        await _sync_elo_index(player_id)
+
+
+async def get_player_data(player_id):
+    return await fetch_one("SELECT * FROM players WHERE id=?", (player_id,))
+
+
+async def get_rating_history(
+    player_id, start=None, end=None, max_points=HISTORY_MAX_POINTS
+):
+    key = (player_id, start, end, max_points, _history_versions.get(player_id, 0))
+    cached = _history_cache.get(key)
+    if cached is not None:
+        return cached
+
+    where = "player_id = ? AND timestamp IS NOT NULL"
+    params = [player_id]
+    if start is not None:
+        where += " AND timestamp >= ?"
+        params.append(start)
+    if end is not None:
+        where += " AND timestamp <= ?"
+        params.append(end)
+
+    count, first, last = await fetch_one(
+        f"""SELECT COUNT(*), julianday(MIN(timestamp)), julianday(MAX(timestamp))
+              FROM elo_history
+             WHERE {where}""",
+        params,
+    )
+    if count <= max_points:
+        rows = await fetch_all(
+            f"""SELECT timestamp, elo_change, elo_change, elo_change, 1
+                  FROM elo_history
+                 WHERE {where}
+                 ORDER BY timestamp, id""",
+            params,
+        )
+    else:
+        # Equal-width time buckets, each reduced to its lowest, highest and
+        # last rating, so long histories come back as at most max_points rows.
+        width = max((last - first) / max_points, 1e-9)
+        rows = await fetch_all(
+            f"""SELECT h.timestamp, h.elo_change, b.low, b.high, b.games
+                  FROM (SELECT MIN(CAST((julianday(timestamp) - ?) / ? AS INTEGER), ?) AS bucket,
+                               MIN(elo_change) AS low,
+                               MAX(elo_change) AS high,
+                               COUNT(*) AS games,
+                               MAX(id) AS last_id
+                          FROM elo_history
+                         WHERE {where}
+                         GROUP BY bucket) b
+                  JOIN elo_history h ON h.id = b.last_id
+                 ORDER BY b.bucket""",
+            [first, width, max_points - 1, *params],
         )
-        players = c.fetchall()
+    history = [
+        {
+            "timestamp": row[0],
+            "elo": row[1],
+            "low": row[2],
+            "high": row[3],
+            "games": row[4],
+        }
+        for row in rows
+    ]
+    _history_cache.put(key, history)
+    return history
 
-        if not players:
-            await ctx.send("❌ No players have signed up for the season!")
-            return False
 
-        role_ranges = get_role_ranges()
+def _utcnow():
+    # pending_reps.timestamp is filled by CURRENT_TIMESTAMP, which is UTC.
+    return datetime.now(timezone.utc).replace(tzinfo=None)
 
-        groups = group_players(players, role_ranges)
 
-        if not groups:
-            await ctx.send("❌ Couldn't group players by league roles!")
-            return False
+def _schedule_expiry(rep_id, reported_at):
+    expires_at = reported_at + timedelta(minutes=PENDING_REP_MINUTES)
+    heapq.heappush(_expiry_heap, (expires_at, rep_id))
+    if _expiry_wakeup is not None and _expiry_heap[0][1] == rep_id:
+        _expiry_wakeup.set()
+
+
+async def _expire_pending_reps(where, params):
+    async with transaction():
+        expired = await fetch_all(
+            f"""SELECT r.id, r.reporter_id, r.result, r.game_number,
+                       p.player1_id, p.player2_id
+                  FROM pending_reps r
+                  LEFT JOIN pairings p ON p.id = r.pairing_id
+                  WHERE {where}""",
+            params,
+        )
+        if expired:
+            await executemany(
+                "DELETE FROM pending_reps WHERE id = ?",
+                [(rep["id"],) for rep in expired],
+            )
+    return expired
 
-        total_pairings = 0
-        for group_name, player_ids in groups.items():
 
-            subgroups = []
-            if len(player_ids) > 7:
+async def _notify_expired(expired, on_expired):
+    for rep in expired:
+        if on_expired is None:
+            continue
+        try:
+            await on_expired(rep)
+        except Exception as e:
+            print(f"Error notifying expired pending match {rep['id']}: {e}")
 
-                import random
 
-                random.shuffle(player_ids)
-                cnt = len(player_ids)
-                result = []
-                while cnt > 12:
-                    cnt -= 6
-                    result.append(6)
+async def _expire_pending_matches(on_expired):
+    global _expiry_wakeup
+    _expiry_wakeup = asyncio.Event()
+    _expiry_heap.clear()
 
-                remainder = cnt // 2
-                result.append(remainder)
-                result.append(cnt - remainder)
+    # Recovery after a restart: both scans are range reads on the timestamp index.
+    cutoff = (_utcnow() - timedelta(minutes=PENDING_REP_MINUTES)).strftime(
+        "%Y-%m-%d %H:%M:%S"
+    )
+    expired = await _expire_pending_reps("r.timestamp < ?", (cutoff,))
+    if expired:
+        print(f"Expired {len(expired)} pending matches while offline")
+    await _notify_expired(expired, on_expired)
+    for rep_id, timestamp in await fetch_all(
+        "SELECT id, timestamp FROM pending_reps WHERE timestamp >= ? ORDER BY timestamp",
+        (cutoff,),
+    ):
+        _schedule_expiry(rep_id, datetime.fromisoformat(timestamp))
 
-                for i in range(len(result)):
-                    for j in range(0, len(result)):
-                        if i != j:
-                            while result[i] > result[j]:
-                                result[j] += 1
-                                result[i] -= 1
+    while True:
+        try:
+            now = _utcnow()
+            due = []
+            while _expiry_heap and _expiry_heap[0][0] <= now:
+                due.append(heapq.heappop(_expiry_heap)[1])
+            if due:
+                # Reports confirmed or cancelled since they were scheduled
+                # are simply not found any more.
+                placeholders = ", ".join("?" * len(due))
+                expired = await _expire_pending_reps(f"r.id IN ({placeholders})", due)
+                await _notify_expired(expired, on_expired)
+
+            _expiry_wakeup.clear()
+            timeout = None
+            if _expiry_heap:
+                timeout = max((_expiry_heap[0][0] - _utcnow()).total_seconds(), 0)
+            try:
+                await asyncio.wait_for(_expiry_wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        except Exception as e:
+            print(f"Error expiring pending matches: {e}")
+            await asyncio.sleep(5)
 
-                nolook = 0
-                for size in result:
-                    subgroups.append(player_ids[nolook : nolook + size])
-                    nolook += size
 
-            else:
-                subgroups = [player_ids]
+def start_pending_expiry(on_expired=None):
+    global _expiry_task
+    if _expiry_task is None or _expiry_task.done():
+        _expiry_task = asyncio.get_running_loop().create_task(
+            _expire_pending_matches(on_expired)
+        )
+    return _expiry_task
 
-            for i, subgroup in enumerate(subgroups):
-                subgroup_name = (
-                    group_name if len(subgroups) == 1 else f"{group_name}-{i + 1}"
-                )
 
-                from itertools import combinations
+async def generate_pairings(ctx, season_number, dry_run=False):
+    try:
+        players = await fetch_all(
+            """SELECT id, elo
+                     FROM players
+                     WHERE signed_up = 1"""
+        )
 
-                pairings = list(combinations(subgroup, 2))
+        if not players:
+            await ctx.send("❌ No players have signed up for the season!")
+            return False
 
-                for p1, p2 in pairings:
+        # Seeded by the season so a preview shows the groups that get created.
+        subgroups = plan_subgroups(players, get_role_ranges(), seed=season_number)
 
-                    c.execute(
-                        """INSERT INTO pairings
-                                     (player1_id, player2_id, season_number, group_name)
-                                 VALUES (?, ?, ?, ?)""",
-                        (p1, p2, season_number, subgroup_name),
-                    )
+        if not subgroups:
+            await ctx.send("❌ Couldn't group players by league roles!")
+            return False
 
-                    total_pairings += 1
+        pairings = plan_pairings(subgroups)
+
+        if dry_run:
+            summary = "\n".join(
+                f"• {name}: {len(ids)} players, {len(ids) * (len(ids) - 1) // 2} pairings"
+                for name, ids in subgroups.items()
+            )
+            await ctx.send(
+                f"🔍 Dry run for season {season_number}: {len(pairings)} pairings\n{summary}"
+            )
+            return True
+
+        async with transaction():
+            group_ids = await _create_groups(season_number, subgroups)
+            await executemany(
+                """INSERT INTO pairings
+                             (player1_id, player2_id, season_number, group_name, group_id)
+                         VALUES (?, ?, ?, ?, ?)""",
+                [
+                    (p1, p2, season_number, name, group_ids[name])
+                    for p1, p2, name in pairings
+                ],
+            )
+            await executemany(
+                """INSERT OR IGNORE INTO standings
+                             (season_number, group_key, player_id)
+                         VALUES (?, ?, ?)""",
+                [
+                    (season_number, canonical_group_key(name), player)
+                    for name, ids in subgroups.items()
+                    for player in ids
+                ],
+            )
 
-        conn.commit()
         await ctx.send(
-            f"✅ Generated {total_pairings} pairings for season {season_number}!"
+            f"✅ Generated {len(pairings)} pairings for season {season_number}!"
         )
         return True
 
     except Exception as e:
         await ctx.send(f"❌ Error generating pairings: {e}")
         return False
-    finally:
-        conn.close()
 
 
-def add_pending_rep(reporter_id, opponent_id, reporter_result):
-    conn = sqlite3.connect(SQLITEFILE)
-    c = conn.cursor()
-    c.execute(
-        """INSERT INTO pending_reps (reporter_id, opponent_id, reporter_result)
-                 VALUES (?, ?, ?)""",
-        (reporter_id, opponent_id, reporter_result),
-    )
-    conn.commit()
-    conn.close()
+async def add_pending_rep(reporter_id, opponent_id, reporter_result):
+    async with transaction():
+        await execute(
+            """INSERT INTO pending_reps (reporter_id, opponent_id, reporter_result)
+                     VALUES (?, ?, ?)""",
+            (reporter_id, opponent_id, reporter_result),
+        )
 
 
 async def find_pairings_in_db(player_id, season, group_name):
-    async with aiosqlite.connect(SQLITEFILE) as conn:
-        conn.row_factory = aiosqlite.Row
-
+    if season is None:
+        row = await fetch_one("SELECT season_number FROM seasons WHERE active=1")
+        season = row["season_number"] if row else None
         if season is None:
-            cur = await conn.execute("SELECT season_number FROM seasons WHERE active=1")
-            row = await cur.fetchone()
-            await cur.close()
-            season = row["season_number"] if row else None
-            if season is None:
-                raise Exception(1)
-
-        cur = await conn.execute(
-            "SELECT 1 FROM seasons WHERE season_number=?", (season,)
+            raise Exception(1)
+
+    if not await fetch_one("SELECT 1 FROM seasons WHERE season_number=?", (season,)):
+        raise Exception(2)
+
+    if group_name is None:
+        grp = await fetch_one(
+            "SELECT group_id FROM pairings WHERE season_number=? AND (player1_id=? OR player2_id=?) LIMIT 1",
+            (season, player_id, player_id),
         )
-        if not await cur.fetchone():
-            await cur.close()
-            raise Exception(2)
-        await cur.close()
-
-        if group_name is None:
-            cur = await conn.execute(
-                "SELECT group_name FROM pairings WHERE season_number=? AND (player1_id=? OR player2_id=?) LIMIT 1",
-                (season, player_id, player_id),
+        if not grp:
+            raise Exception(3)
+        group_id = grp["group_id"]
+    else:
+        group = await resolve_group(season, group_name)
+        if group is None:
+            rows = await fetch_all(
+                "SELECT name FROM groups WHERE season_number=? ORDER BY id", (season,)
             )
-            grp = await cur.fetchone()
-            await cur.close()
-            if not grp:
-                raise Exception(3)
-            group_name = grp["group_name"]
-
-        if group_name:
+            valid = [r["name"].lower() for r in rows]
+            sugg = [g for g in valid if group_name.lower() in g]
+            msg = f"❌ Group '{group_name}' not found in season {season}!"
+            if sugg:
+                msg += f"\nDid you mean: {', '.join(sugg[:3])}?"
+            raise Exception(msg)
+        group_id = group["id"]
+
+    (count,) = await fetch_one(
+        "SELECT COUNT(*) FROM pairings WHERE group_id=?", (group_id,)
+    )
+    return group_id, season, count
+
+
+async def get_pairings_page(group_id, after_id=0, limit=PAIRINGS_PER_PAGE):
+    sql = (
+        "SELECT pr.id, pr.player1_id, pr.player2_id, pr.result1, pr.result2, "
+        "p1.display_name AS player1_name, p2.display_name AS player2_name "
+        "FROM pairings pr "
+        "LEFT JOIN players p1 ON p1.id = pr.player1_id "
+        "LEFT JOIN players p2 ON p2.id = pr.player2_id "
+        "WHERE pr.group_id=? AND pr.id > ? "
+        "ORDER BY pr.id LIMIT ?"
+    )
+    return await fetch_all(sql, (group_id, after_id, limit))
 
-            if "procrastination" in group_name.lower() or "lazy" in group_name.lower():
-                group_name = "Pro League"
 
-            cur = await conn.execute(
-                "SELECT DISTINCT group_name FROM pairings WHERE season_number=?",
-                (season,),
-            )
-            valid = [r["group_name"].lower() for r in await cur.fetchall()]
-            await cur.close()
-            if group_name.lower() not in valid:
-                sugg = [g for g in valid if group_name.lower() in g]
-                msg = f"❌ Group '{group_name}' not found in season {season}!"
-                if sugg:
-                    msg += f"\nDid you mean: {', '.join(sugg[:3])}?"
-                raise Exception(msg)
-
-        if group_name:
-            title += f", {group_name}"
-
-        sql = (
-            "SELECT player1_id, player2_id, result1, result2 "
-            "FROM pairings WHERE season_number=?"
-        )
-        params = [season]
-        if group_name:
-            sql += " AND LOWER(group_name)=LOWER(?)"
-            params.append(group_name)
-        sql += " ORDER BY id"
-
-        cur = await conn.execute(sql, params)
-        pairings = await cur.fetchall()
-        await cur.close()
-        return pairings, season
-
-
-def get_pending_rep(reporter_id, pairing_id):
-    conn = sqlite3.connect(SQLITEFILE)
-    c = conn.cursor()
-    cutoff_time = datetime.now() - timedelta(minutes=30)
-    cutoff_str = cutoff_time.strftime("%Y-%m-%d %H:%M:%S")
-    c.execute(
+async def get_pending_rep(reporter_id, pairing_id):
+    return await fetch_one(
         """SELECT *
                  FROM pending_reps
                  WHERE reporter_id = ?
                    AND pairing_id = ?
-                   AND timestamp >= ?
                  ORDER BY timestamp DESC LIMIT 1""",
-        (reporter_id, pairing_id, cutoff_str),
+        (reporter_id, pairing_id),
     )
-    rep = c.fetchone()
-    conn.close()
-    return rep
 
 
-def update_season_game(match, game, result):
-    conn = sqlite3.connect(SQLITEFILE)
+async def update_season_game(match, game, result):
     if game not in [1, 2]:
         return "", "wrong game number"
-    c = conn.cursor()
-    c.execute(
-        """
-            UPDATE pairings
-            SET {game} = :new_result
-            WHERE id = :pairing_id
-        """,
-        {"new_result": result, "pairing_id": match},
-    )
-    conn.commit()
-    conn.close()
+    async with transaction():
+        await execute(
+            f"""
+                UPDATE pairings
+                SET result{game} = :new_result
+                WHERE id = :pairing_id
+            """,
+            {"new_result": result, "pairing_id": match},
+        )
 
 
-def update_match_history(match, game, result):
-    conn = sqlite3.connect(SQLITEFILE)
-    c = conn.cursor()
-    c.execute(
+async def update_match_history(match, game, result):
+    row = await fetch_one(
         """
               SELECT player1_id,player2_id,season_number,group_name
               FROM pairings
@@ -288,7 +486,7 @@ def update_match_history(match, game, result):
     mapping = {1.0: "w", 0.0: "b", 0.5: "d"}
 
     if game == 1:
-        whitePlayer, blackPlayer, season, league = c.fetchone()
+        whitePlayer, blackPlayer, season, league = row
         data = {
             "white": whitePlayer,
             "black": blackPlayer,
@@ -297,7 +495,7 @@ def update_match_history(match, game, result):
             "league": league,
         }
     else:
-        blackPlayer, whitePlayer, season, league = c.fetchone()
+        blackPlayer, whitePlayer, season, league = row
         data = {
             "white": whitePlayer,
             "black": blackPlayer,
@@ -305,46 +503,43 @@ def update_match_history(match, game, result):
             "season": season,
             "league": league,
         }
-    c = conn.cursor()
-    c.execute(
-        """
-        INSERT INTO match_history (whiteplayer, blackplayer, colorwon, season, league)
-        VALUES (:white, :black, :result, :season, :league)
-        """,
-        data,
-    )
-    conn.commit()
-    conn.close()
+    data["group_key"] = canonical_group_key(league)
+    async with transaction():
+        await execute(
+            """
+            INSERT INTO match_history (whiteplayer, blackplayer, colorwon, season, league, season_number, group_key)
+            VALUES (:white, :black, :result, :season, :league, :season, :group_key)
+            """,
+            data,
+        )
+        await _add_game_to_standings(
+            season, data["group_key"], data["white"], data["black"], data["result"]
+        )
 
 
-def find_player_group(player_id, season):
-    conn = sqlite3.connect(SQLITEFILE)
-    c = conn.cursor()
-    c.execute(
+async def find_player_group(player_id, season):
+    group = await fetch_one(
         """
         SELECT group_name FROM pairings where (player1_id = :player or player2_id = :player) and season_number = :season;
         """,
         {"season": season, "player": player_id},
     )
-    group = c.fetchone()
     if not group:
-        c.execute(
+        group = await fetch_one(
             """
-            SELECT league from match_history where (whiteplayer = :player or blackplayer = :player) and REPLACE(UPPER(season), 'SEASON ', '') = :season
+            SELECT league from match_history where season_number = :season and whiteplayer = :player
+            UNION ALL
+            SELECT league from match_history where season_number = :season and blackplayer = :player
             """,
             {"season": season, "player": player_id},
         )
-        group = c.fetchone()
     if not group:
         group = ("",)
     return group[0]
 
 
-def get_specific_pairing(player_id: int, oppoent_id: int, c=None):
-
-    conn = sqlite3.connect(SQLITEFILE)
-    c = conn.cursor()
-    c.execute(
+async def get_specific_pairing(player_id: int, oppoent_id: int):
+    return await fetch_one(
         """SELECT id, player1_id, player2_id, result1, result2
                          FROM pairings
                          WHERE ((player1_id = :playerA AND player2_id = :playerB)
@@ -356,270 +551,422 @@ def get_specific_pairing(player_id: int, oppoent_id: int, c=None):
             "playerB": oppoent_id,
         },
     )
-    pairing = c.fetchone()
-
-    conn.close()
-    return pairing
 
 
-def get_group_ranking(season, group):
-    def players_activeseason(p):
-        return f"SELECT DISTINCT(player{p}_id) FROM pairings WHERE group_name = REPLACE(:group, '-B', '-2') or group_name = REPLACE(:group, '-A', '-1') or group_name = REPLACE(:group, '-c', '-3') or group_name = REPLACE(:group, '-D', '-4')"
+def _parse_wonagainst(wonagainst):
+    return [int(opponent) for opponent in wonagainst.split(",")] if wonagainst else []
+
+
+async def compute_standings(season=None, group_key=None):
+    where = "WHERE season_number IS NOT NULL"
+    if season is not None:
+        where += " AND season_number = :season AND group_key = :group_key"
+    return await fetch_all(
+        f"""SELECT season_number,
+                  group_key,
+                  player_id,
+                  SUM(points) AS points,
+                  COUNT(*) AS games_played,
+                  GROUP_CONCAT(beaten) AS wonagainst
+            FROM (
+                SELECT season_number, group_key, whiteplayer AS player_id,
+                       CASE colorwon WHEN 'w' THEN 1 WHEN 'd' THEN 0.5 ELSE 0 END AS points,
+                       CASE colorwon WHEN 'w' THEN blackplayer END AS beaten
+                FROM match_history
+                {where}
 
-    def players_historicseason(p):
-        return f"""
-            SELECT DISTINCT({p}player)
-            FROM match_history
-            WHERE REPLACE(UPPER(season), 'SEASON ', '') = :season
-            AND (league = :group OR league = REPLACE(:group, '-A', '-1') OR league = REPLACE(:group, '-B', '-2') OR league = REPLACE(:group, '-C', '-3') OR league = REPLACE(:group, '-D', '-4'))
-        """
+                UNION ALL
 
-    conn = sqlite3.connect(SQLITEFILE)
-    c = conn.cursor()
-    c.execute("SELECT active FROM seasons WHERE season_number = ?", (season,))
-    if c.fetchone():
-        c.execute(players_activeseason(1), {"group": group})
-        playerlist = {player[0] for player in c.fetchall()}
-        c.execute(players_activeseason(2), {"group": group})
-        playerlist.update({player[0] for player in c.fetchall()})
-    else:
-        sqlObj = {"season": season, "group": group}
-        c.execute(players_historicseason("white"), sqlObj)
-        playerlist = {player[0] for player in c.fetchall()}
-        c.execute(players_historicseason("black"), sqlObj)
-        playerlist.update({player[0] for player in c.fetchall()})
-    leaderboard = []
-    for player in playerlist:
-        c.execute(
-            """SELECT
-                    SUM(
-                        CASE 
-                            WHEN colorwon = 'w' AND whiteplayer = :player THEN 1
-                            WHEN colorwon = 'b' AND blackplayer = :player THEN 1
-                            WHEN colorwon = 'd' AND (blackplayer = :player OR whiteplayer = :player) THEN 0.5
-                            ELSE 0
-                        END
-                    ) AS total_points
+                SELECT season_number, group_key, blackplayer AS player_id,
+                       CASE colorwon WHEN 'b' THEN 1 WHEN 'd' THEN 0.5 ELSE 0 END AS points,
+                       CASE colorwon WHEN 'b' THEN whiteplayer END AS beaten
                 FROM match_history
-                WHERE REPLACE(UPPER(season), 'SEASON ', '') = :season;
-            """,
-            {"player": player, "season": str(season)},
+                {where}
+            )
+            GROUP BY season_number, group_key, player_id
+        """,
+        {"season": season, "group_key": group_key},
+    )
+
+
+async def _add_game_to_standings(season, group_key, white, black, colorwon):
+    points = {"w": (1, 0), "b": (0, 1), "d": (0.5, 0.5)}[colorwon]
+    beaten = {"w": (str(black), ""), "b": ("", str(white)), "d": ("", "")}[colorwon]
+    for player, player_points, player_beaten in zip((white, black), points, beaten):
+        await execute(
+            """INSERT INTO standings
+                     (season_number, group_key, player_id, points, games_played, wonagainst)
+                 VALUES (?, ?, ?, ?, 1, ?)
+                 ON CONFLICT (season_number, group_key, player_id) DO UPDATE
+                 SET points = points + excluded.points,
+                     games_played = games_played + 1,
+                     wonagainst = CASE
+                         WHEN excluded.wonagainst = '' THEN wonagainst
+                         WHEN wonagainst = '' THEN excluded.wonagainst
+                         ELSE wonagainst || ',' || excluded.wonagainst
+                     END""",
+            (season, group_key, player, player_points, player_beaten),
         )
 
-        points = c.fetchone()[0]
-        c.execute(
-            """SELECT opponent_id
-                FROM (
-                    SELECT blackplayer AS opponent_id
-                    FROM match_history
-                    WHERE colorwon = 'w'
-                    AND whiteplayer = :player
-                    AND REPLACE(UPPER(season), 'SEASON ', '') = :season
-
-                    UNION ALL
-
-                    SELECT whiteplayer AS opponent_id
-                    FROM match_history
-                    WHERE colorwon = 'b'
-                    AND blackplayer = :player
-                    AND REPLACE(UPPER(season), 'SEASON ', '') = :season
-                )
-            """,
-            {"player": player, "season": str(season)},
+
+async def rebuild_standings():
+    # The pairings and match_history reads share the transaction with the
+    # rewrite, so a confirmation can't land between them and get dropped.
+    async with transaction():
+        return await _rebuild_standings()
+
+
+async def _rebuild_standings():
+    computed = {}
+    rows = await fetch_all(
+        """SELECT season_number, group_name, player1_id FROM pairings
+           UNION
+           SELECT season_number, group_name, player2_id FROM pairings"""
+    )
+    for season, group_name, player in rows:
+        computed[(season, canonical_group_key(group_name), player)] = (0, 0, [])
+    for row in await compute_standings():
+        computed[(row["season_number"], row["group_key"], row["player_id"])] = (
+            row["points"],
+            row["games_played"],
+            _parse_wonagainst(row["wonagainst"]),
         )
-        if points == None:
-            points = 0
-        wonagainstlist = [opponent[0] for opponent in c.fetchall()]
-        leaderboard.append(
-            {"id": player, "points": points, "wonagainst": wonagainstlist, "sb": 0}
+
+    inconsistent = 0
+    stored = {
+        (row["season_number"], row["group_key"], row["player_id"]): (
+            row["points"],
+            row["games_played"],
+            sorted(_parse_wonagainst(row["wonagainst"])),
+        )
+        for row in await fetch_all(
+            "SELECT season_number, group_key, player_id, points, games_played, wonagainst FROM standings"
         )
-    conn.close()
+    }
+    for key in computed.keys() | stored.keys():
+        expected = computed.get(key)
+        if expected is not None:
+            expected = (expected[0], expected[1], sorted(expected[2]))
+        if stored.get(key) != expected:
+            inconsistent += 1
+
+    await execute("DELETE FROM standings")
+    await executemany(
+        """INSERT INTO standings
+                 (season_number, group_key, player_id, points, games_played, wonagainst)
+             VALUES (?, ?, ?, ?, ?, ?)""",
+        [
+            (*key, points, games, ",".join(str(o) for o in wonagainst))
+            for key, (points, games, wonagainst) in computed.items()
+        ],
+    )
+    return len(computed), inconsistent
+
+
+async def backfill_standings():
+    async with transaction():
+        if await fetch_one("SELECT 1 FROM standings LIMIT 1"):
+            return None
+        if not await fetch_one(
+            "SELECT 1 FROM match_history UNION ALL SELECT 1 FROM pairings LIMIT 1"
+        ):
+            return None
+        return await _rebuild_standings()
+
+
+async def get_group_ranking(season, group):
+    resolved = await resolve_group(season, group)
+    if resolved is None:
+        return []
+    rows = await fetch_all(
+        """SELECT s.player_id, s.points, s.wonagainst, p.display_name
+             FROM standings s
+             LEFT JOIN players p ON p.id = s.player_id
+             WHERE s.season_number = ? AND s.group_key = ?""",
+        (season, resolved["group_key"]),
+    )
+    leaderboard = [
+        {
+            "id": row["player_id"],
+            "name": row["display_name"],
+            "points": row["points"],
+            "wonagainst": _parse_wonagainst(row["wonagainst"]),
+            "sb": 0,
+        }
+        for row in rows
+    ]
     leaderboard = calculate_sb(leaderboard)
     return leaderboard
 
 
-def get_latest_season():
-    conn = sqlite3.connect(SQLITEFILE)
-    c = conn.cursor()
-    c.execute(
+async def get_latest_season():
+    return await fetch_one(
         "SELECT season_number,active FROM seasons ORDER BY season_number DESC LIMIT 1"
     )
-    latest_season = c.fetchone()
-    conn.close()
-    return latest_season
-
-
-def register_new_player(player_id):
-    conn = sqlite3.connect(SQLITEFILE)
-    c = conn.cursor()
-    c.execute("INSERT INTO players (id, elo) VALUES (?, ?)", (player_id, INITIAL_ELO))
-    conn.commit()
-    conn.close()
-
-
-def sign_up_player(player_id):
-    conn = sqlite3.connect(SQLITEFILE)
-    c = conn.cursor()
-    c.execute("UPDATE players SET signed_up=1 WHERE id=?", (player_id,))
-    conn.commit()
-    conn.close()
-
-
-def find_signed_players():
-    conn = sqlite3.connect(SQLITEFILE)
-    c = conn.cursor()
-    c.execute("SELECT id, elo FROM players WHERE signed_up=1")
-    players = c.fetchall()
-    conn.close()
-    return players
-
-
-def update_missed_seasons():
-    conn = sqlite3.connect(SQLITEFILE)
-    c = conn.cursor()
-    c.execute("UPDATE players SET seasons_missed = 0 WHERE signed_up = 1")
-    c.execute(
-        "UPDATE players SET seasons_missed = seasons_missed + 1 WHERE signed_up = 0"
+
+
+async def register_new_player(player_id, display_name=None):
+    async with transaction():
+        await execute(
+            "INSERT INTO players (id, elo, display_name) VALUES (?, ?, ?)",
+            (player_id, INITIAL_ELO, display_name),
+        )
+        if display_name:
+            await _record_aliases([(player_id, display_name)])
+        await _sync_elo_index(player_id)
+
+
+async def _record_aliases(names):
+    await executemany(
+        """INSERT INTO player_aliases (player_id, alias)
+                 SELECT ?1, ?2 WHERE EXISTS (SELECT 1 FROM players WHERE id = ?1)
+                 ON CONFLICT (alias) DO UPDATE SET player_id = excluded.player_id""",
+        names,
     )
-    conn.commit()
-    conn.close()
 
 
-def find_unsigned_players():
-    conn = sqlite3.connect(SQLITEFILE)
-    c = conn.cursor()
-    c.execute("SELECT id, elo, seasons_missed FROM players WHERE signed_up=0")
-    n_players = c.fetchall()
-    conn.close()
-    return n_players
+async def update_display_names(names):
+    # names: [(player_id, display_name or None)]; unregistered ids are ignored.
+    async with transaction():
+        changed = await _update_display_names(names)
+    return changed
 
 
-def punish_player(player_id, elo, missed_seasons):
-    conn = sqlite3.connect()
-    c = conn.cursor()
-    if missed_seasons > 1:
-        if elo - 1380 > 10:
-            elo -= 10
-        else:
-            elo = 1380
+async def _update_display_names(names):
+    changed = await executemany(
+        """UPDATE players SET display_name = ?2
+                 WHERE id = ?1 AND display_name IS NOT ?2""",
+        names,
+    )
+    await _record_aliases([(pid, name) for pid, name in names if name])
+    if changed > 0:
+        _invalidate_leaderboard_cache()
+        on_rollback(_invalidate_leaderboard_cache)
+        if _elo_index is not None:
+            on_rollback(_reset_elo_index)
+            for player_id, name in names:
+                row = _elo_index.get(player_id)
+                if row is not None:
+                    row["display_name"] = name
+    return changed
+
+
+async def sync_display_names(names):
+    # Full refresh from the guild member list: registered players missing
+    # from it have left the server and lose their display name.
+    names = dict(names)
+    async with transaction():
+        registered = await fetch_all("SELECT id FROM players")
+        changed = await _update_display_names(
+            [(row["id"], names.get(row["id"])) for row in registered]
+        )
+    return changed
 
-        c.execute("UPDATE players SET elo = ? WHERE id = ?", (elo, player_id))
-        conn.commit()
-    conn.close()
 
+async def sign_up_player(player_id):
+    async with transaction():
+        await execute("UPDATE players SET signed_up=1 WHERE id=?", (player_id,))
 
-def setup_future_season(old_season, new_season):
-    conn = sqlite3.connect(SQLITEFILE)
-    c = conn.cursor()
-    c.execute("UPDATE players SET signed_up=0")
-    c.execute(
-        "INSERT INTO seasons (season_number, active) VALUES (?, 0)", (new_season,)
+
+async def find_signed_players():
+    return await fetch_all("SELECT id, elo FROM players WHERE signed_up=1")
+
+
+async def update_missed_seasons():
+    async with transaction():
+        await execute("UPDATE players SET seasons_missed = 0 WHERE signed_up = 1")
+        await execute(
+            "UPDATE players SET seasons_missed = seasons_missed + 1 WHERE signed_up = 0"
+        )
+
+
+async def find_unsigned_players():
+    return await fetch_all(
+        "SELECT id, elo, seasons_missed FROM players WHERE signed_up=0"
     )
 
-    c.execute("UPDATE seasons SET active=0 WHERE season_number=?", (old_season,))
-    conn.commit()
-    conn.close()
 
+async def punish_player(player_id, elo, missed_seasons):
+    if missed_seasons > 1:
+        elo = penalised_elo(elo)
+
+        async with transaction():
+            # Recorded against the last rated match so a replay of
+            # match_history applies the penalty at the same point.
+            await execute(
+                """INSERT INTO penalties (player_id, amount, floor, after_match)
+                     SELECT ?, ?, ?, COALESCE(MAX(match), 0) FROM match_history""",
+                (player_id, INACTIVITY_PENALTY, INITIAL_ELO),
+            )
+            await execute(
+                "INSERT INTO elo_history (player_id, elo_change) VALUES (?,?)",
+                (player_id, elo),
+            )
+            await execute("UPDATE players SET elo = ? WHERE id = ?", (elo, player_id))
+            _bump_history_version(player_id)
+            on_rollback(lambda: _bump_history_version(player_id))
+            await _sync_elo_index(player_id)
+
+
+async def _snapshot_season(season, boundary):
+    # One INSERT ... SELECT over players. The CASE mirrors find_role, ranges
+    # are sorted highest first and the first match wins.
+    role_ranges = get_role_ranges()
+    role = "NULL"
+    params = [season, boundary]
+    if role_ranges:
+        role = (
+            "CASE "
+            + " ".join("WHEN elo BETWEEN ? AND ? THEN ?" for _ in role_ranges)
+            + " END"
+        )
+        for role_range in role_ranges:
+            params += [role_range["min"], role_range["max"], role_range["name"]]
+    await execute(
+        f"""INSERT OR REPLACE INTO season_snapshots
+                 (season_number, boundary, player_id, elo, wins, losses, draws, role, signed_up)
+             SELECT ?, ?, id, elo, wins, losses, draws, {role}, signed_up
+               FROM players""",
+        params,
+    )
 
-def activate_season(current_season):
-    conn = sqlite3.connect(SQLITEFILE)
-    c = conn.cursor()
-    c.execute("UPDATE seasons SET active=1 WHERE season_number=?", (current_season,))
-    conn.commit()
-    conn.close()
 
+async def get_season_snapshot(season, boundary="start"):
+    return await fetch_all(
+        """SELECT s.player_id, s.elo, s.wins, s.losses, s.draws, s.role, s.signed_up,
+                  p.display_name
+             FROM season_snapshots s
+             LEFT JOIN players p ON p.id = s.player_id
+            WHERE s.season_number = ? AND s.boundary = ?
+            ORDER BY s.elo DESC""",
+        (season, boundary),
+    )
 
-async def bundle_leaderboard(player_id, limit, member_ids):
-    async with aiosqlite.connect(SQLITEFILE) as conn:
-        conn.row_factory = aiosqlite.Row
 
-        # 3a. total players (for “of X” in footer)
-        if member_ids:
-            q_total = f"SELECT COUNT(*) as cnt FROM players WHERE id IN ({','.join('?'*len(member_ids))})"
-            cur = await conn.execute(q_total, member_ids)
-        else:
-            cur = await conn.execute("SELECT COUNT(*) as cnt FROM players")
-        row = await cur.fetchone()
-        await cur.close()
-        total_players = row["cnt"]
-
-        # 3b. find your own ELO & rank
-        cur = await conn.execute(
-            "SELECT elo, wins, losses, draws FROM players WHERE id=?", (player_id,)
+async def bundle_season_leaderboard(season, boundary, player_id, limit, member_ids):
+    # Same shape as bundle_leaderboard, ranked from a season snapshot.
+    index = EloIndex(
+        {
+            "id": row["player_id"],
+            "elo": row["elo"],
+            "wins": row["wins"],
+            "losses": row["losses"],
+            "draws": row["draws"],
+            "display_name": row["display_name"],
+        }
+        for row in await get_season_snapshot(season, boundary)
+    )
+    you = index.get(player_id)
+    if member_ids:
+        index = index.subset(member_ids)
+    return _rank_in(index, you, limit)
+
+
+async def get_season_changes(season):
+    # Against the end snapshot once the season is over, the live ratings
+    # while it is still running.
+    ended = await fetch_one(
+        "SELECT 1 FROM season_snapshots WHERE season_number = ? AND boundary = 'end' LIMIT 1",
+        (season,),
+    )
+    if ended:
+        after = """SELECT player_id, elo, wins, losses, draws
+                     FROM season_snapshots
+                    WHERE season_number = :season AND boundary = 'end'"""
+    else:
+        after = "SELECT id AS player_id, elo, wins, losses, draws FROM players"
+    return await fetch_all(
+        f"""SELECT s.player_id,
+                   p.display_name,
+                   s.elo AS start_elo,
+                   a.elo AS elo,
+                   a.elo - s.elo AS elo_change,
+                   a.wins - s.wins AS wins,
+                   a.losses - s.losses AS losses,
+                   a.draws - s.draws AS draws
+              FROM season_snapshots s
+              JOIN ({after}) a ON a.player_id = s.player_id
+              LEFT JOIN players p ON p.id = s.player_id
+             WHERE s.season_number = :season AND s.boundary = 'start'
+             ORDER BY elo_change DESC""",
+        {"season": season},
+    )
+
+
+async def setup_future_season(old_season, new_season):
+    async with transaction():
+        await _snapshot_season(old_season, "end")
+        await execute("UPDATE players SET signed_up=0")
+        await execute(
+            "INSERT INTO seasons (season_number, active) VALUES (?, 0)", (new_season,)
         )
-        you = await cur.fetchone()
-        await cur.close()
-
-        user_rank = None
-        surrounding = []
-        if you:
-            your_elo = you["elo"]
-            # count how many have strictly higher ELO
-            if member_ids:
-                q_rank = (
-                    f"SELECT COUNT(*) as cnt FROM players WHERE elo>? "
-                    f"AND id IN ({','.join('?'*len(member_ids))})"
-                )
-                params = (your_elo, *member_ids)
-            else:
-                q_rank = "SELECT COUNT(*) as cnt FROM players WHERE elo>?"
-                params = (your_elo,)
-            cur = await conn.execute(q_rank, params)
-            user_rank = (await cur.fetchone())["cnt"] + 1
-            await cur.close()
-
-        # 3c. fetch leaderboard rows
-        rows = []
-        base_query = "SELECT id, elo, wins, losses, draws FROM players"
-        where = ""
-        params = ()
-        if member_ids:
-            where = f" WHERE id IN ({','.join('?'*len(member_ids))})"
-            params = tuple(member_ids)
-        order = " ORDER BY elo DESC"
-
-        if you and user_rank and user_rank > limit:
-            #  top N + your surrounding 3
-            top_q = base_query + where + order + " LIMIT ?"
-            cur = await conn.execute(top_q, params + (limit,))
-            top = await cur.fetchall()
-            await cur.close()
-
-            off = max(0, user_rank - 2)
-            surround_q = base_query + where + order + " LIMIT 3 OFFSET ?"
-            cur = await conn.execute(surround_q, params + (off,))
-            surrounding = await cur.fetchall()
-            await cur.close()
-            rows = top
-        else:
-            # user is in top N or not registered → just top N
-            top_q = base_query + where + order + " LIMIT ?"
-            cur = await conn.execute(top_q, params + (limit,))
-            rows = await cur.fetchall()
-            await cur.close()
+
+        await execute(
+            "UPDATE seasons SET active=0 WHERE season_number=?", (old_season,)
+        )
+
+
+async def activate_season(current_season):
+    async with transaction():
+        await execute(
+            "UPDATE seasons SET active=1 WHERE season_number=?", (current_season,)
+        )
+        await _snapshot_season(current_season, "start")
+
+
+async def bundle_leaderboard(player_id, limit, member_ids):
+    members_key = frozenset(member_ids) if member_ids else None
+    key = (player_id, limit, members_key)
+    cached = _leaderboard_cache.get(key)
+    if cached is not None:
+        return cached
+
+    index = await get_elo_index()
+    you = index.get(player_id)
+    if members_key:
+        subset = _role_subset_cache.get(members_key)
+        if subset is None:
+            subset = index.subset(members_key)
+            _role_subset_cache.put(members_key, subset)
+        index = subset
+
+    result = _rank_in(index, you, limit)
+    _leaderboard_cache.put(key, result)
+    return result
+
+
+def _rank_in(index, you, limit):
+    # 3a. total players (for “of X” in footer)
+    total_players = len(index)
+
+    # 3b. your rank: how many have strictly higher ELO
+    user_rank = None
+    surrounding = []
+    if you:
+        user_rank = index.count_above(you["elo"]) + 1
+
+    # 3c. leaderboard rows: top N, plus your surrounding 3 if you're outside it
+    rows = index.top(limit)
+    if you and user_rank > limit:
+        surrounding = index.slice(max(0, user_rank - 2), 3)
     return total_players, you, user_rank, surrounding, rows
 
 
-def add_and_resolve_report(author_id, opponent_id, game_number, result):
-    conn = sqlite3.connect(SQLITEFILE)
-    c = conn.cursor()
+async def add_and_resolve_report(author_id, opponent_id, game_number, result):
     new_rep = False
+    rating_changes = None
 
-    def find_gameresults_in_db(inner_p1_id, inner_p2_id):
-        c.execute(
-            """SELECT result1, result2 FROM pairings WHERE (player1_id = ? AND player2_id = ?) AND season_number = (SELECT season_number FROM seasons WHERE active = 1)""",
-            (inner_p1_id, inner_p2_id),
+    async with transaction():
+        (season_active,) = await fetch_one(
+            "SELECT active FROM seasons ORDER BY season_number DESC LIMIT 1"
         )
-        return c.fetchone()
+        if not season_active:
+            raise Exception(1)
 
-    season_active = c.execute(
-        "SELECT active FROM seasons ORDER BY season_number DESC LIMIT 1"
-    ).fetchone()[0]
-    if season_active:
-        pairing = get_specific_pairing(author_id, opponent_id)
+        pairing = await get_specific_pairing(author_id, opponent_id)
         if not pairing:
             raise Exception(1)
-        pairing_id, p1_id, p2_id, _, _ = pairing
+        pairing_id, p1_id, p2_id, game1, game2 = pairing
         is_player1 = author_id == p1_id
         result_value = (
             1.0
@@ -629,7 +976,7 @@ def add_and_resolve_report(author_id, opponent_id, game_number, result):
         if result == "d":
             result_value = 0.5
 
-        c.execute(
+        existing_rep = await fetch_one(
             """SELECT reporter_id, result
                         FROM pending_reps
                         WHERE pairing_id = ?
@@ -637,9 +984,7 @@ def add_and_resolve_report(author_id, opponent_id, game_number, result):
             """,
             (pairing_id, game_number),
         )
-        existing_rep = c.fetchone()
 
-        game1, game2 = find_gameresults_in_db(p1_id, p2_id)
         if game_number == 1:
             if game1 is not None:
                 raise Exception(2)
@@ -652,32 +997,51 @@ def add_and_resolve_report(author_id, opponent_id, game_number, result):
                 if result != expected_result:
                     raise Exception(3)
 
-                c.execute(
-                    f"""UPDATE pairings 
+                await execute(
+                    f"""UPDATE pairings
                                  SET result{game_number}=?
                                  WHERE id=?""",
                     (result_value, pairing_id),
                 )
-                conn.commit()
-                update_match_history(
+                await update_match_history(
                     pairing_id,
                     game_number,
                     result_value,
                 )
-                c.execute("DELETE FROM pending_reps WHERE pairing_id=?", (pairing_id,))
-                conn.commit()
+                await execute(
+                    "DELETE FROM pending_reps WHERE pairing_id=?", (pairing_id,)
+                )
+                if game_number == 1:
+                    game1 = result_value
+                else:
+                    game2 = result_value
+                if game1 is not None and game2 is not None:
+                    rating_changes = await _rate_pairing(p1_id, p2_id, game1, game2)
             else:
                 raise Exception(4)
         else:
-            c.execute(
+            _, rep_id = await execute(
                 """INSERT INTO pending_reps
                                 (pairing_id, reporter_id, result, game_number)
                             VALUES (?, ?, ?, ?)""",
                 (pairing_id, author_id, result, game_number),
             )
-            conn.commit()
+            _schedule_expiry(rep_id, _utcnow())
             new_rep = True
 
-    game1, game2 = find_gameresults_in_db(p1_id, p2_id)
-    conn.close()
-    return game1, game2, p1_id, p2_id, new_rep
+    return game1, game2, p1_id, p2_id, new_rep, rating_changes
+
+
+async def _rate_pairing(p1_id, p2_id, game1, game2):
+    rows = await fetch_all(
+        "SELECT id, elo FROM players WHERE id IN (?, ?)", (p1_id, p2_id)
+    )
+    elos = {row["id"]: row["elo"] for row in rows}
+    player1_new_stats, player2_new_stats = calculate_match_stats(
+        game1, game2, elos[p1_id], elos[p2_id]
+    )
+    for player_id, stats in ((p1_id, player1_new_stats), (p2_id, player2_new_stats)):
+        await update_player_stats(
+            player_id, stats["elo"], stats["wins"], stats["losses"], stats["draws"]
+        )
+    return (elos[p1_id], player1_new_stats), (elos[p2_id], player2_new_stats)
@@ -0,0 +1,322 @@
+import asyncio
+import re
+import sqlite3
+import time
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+
+import aiosqlite
+from constants import DEFAULT_SQLITE_PROFILE, SQLITE_PROFILES, SQLITEFILE
+from perf import current_invocation, record_query
+
+PRAGMA_SETTINGS = [
+    "journal_mode",
+    "synchronous",
+    "busy_timeout",
+    "mmap_size",
+    "cache_size",
+]
+
+_connection = None
+_reader = None
+_connect_lock = asyncio.Lock()
+_rollback_hooks = ContextVar("rollback_hooks", default=None)
+_writer = None
+_queue = None
+# Transactions queued while a batch is open share its commit. A non-zero
+# window (group_commit_window_ms in config.csv) also holds the commit back
+# for stragglers, trading single-write latency for bigger batches.
+GROUP_COMMIT_MAX_JOBS = 64
+_group_commit_window = 0.0
+_pragmas = dict(SQLITE_PROFILES[DEFAULT_SQLITE_PROFILE])
+
+
+def configure(config=None, profile=None):
+    # config is the config.csv mapping; sqlite_<pragma> entries override the
+    # chosen profile one setting at a time.
+    global _pragmas, _group_commit_window
+    config = config or {}
+    _group_commit_window = float(config.get("group_commit_window_ms") or 0) / 1000
+    profile = profile or config.get("sqlite_profile") or DEFAULT_SQLITE_PROFILE
+    if profile not in SQLITE_PROFILES:
+        raise ValueError(
+            f"Unknown sqlite_profile '{profile}', expected one of {', '.join(SQLITE_PROFILES)}"
+        )
+    pragmas = dict(SQLITE_PROFILES[profile])
+    for setting in PRAGMA_SETTINGS:
+        value = config.get(f"sqlite_{setting}")
+        if value:
+            if not re.fullmatch(r"-?\w+", value.strip()):
+                raise ValueError(f"Invalid value for sqlite_{setting}: {value}")
+            pragmas[setting] = value.strip()
+    _pragmas = pragmas
+    return pragmas
+
+
+def pragma_statements():
+    return [f"PRAGMA {setting} = {value}" for setting, value in _pragmas.items()]
+
+
+def connect_sync(db_file=SQLITEFILE):
+    conn = sqlite3.connect(db_file)
+    for statement in pragma_statements():
+        conn.execute(statement)
+    return conn
+
+
+async def _open(db_file):
+    conn = await aiosqlite.connect(db_file)
+    conn.row_factory = aiosqlite.Row
+    for statement in pragma_statements():
+        await conn.execute(statement)
+    return conn
+
+
+async def connect(db_file=SQLITEFILE):
+    global _connection, _reader
+    async with _connect_lock:
+        if _connection is None:
+            _connection = await _open(db_file)
+            # Under WAL, reads outside transaction() go through a second,
+            # read-only connection. It only sees committed data, never the
+            # open write batch, which may still roll back.
+            cur = await _connection.execute("PRAGMA journal_mode")
+            (journal_mode,) = await cur.fetchone()
+            await cur.close()
+            if journal_mode.lower() == "wal":
+                _reader = await _open(db_file)
+                await _reader.execute("PRAGMA query_only = 1")
+    return _connection
+
+
+async def get_connection():
+    if _connection is None:
+        return await connect()
+    return _connection
+
+
+async def _read_connection():
+    conn = await get_connection()
+    if _reader is None or _rollback_hooks.get() is not None:
+        return conn
+    return _reader
+
+
+async def close():
+    global _connection, _reader, _writer, _queue
+    if _writer is not None:
+        _writer.cancel()
+        try:
+            await _writer
+        except asyncio.CancelledError:
+            pass
+        _writer, _queue = None, None
+    if _reader is not None:
+        await _reader.close()
+        _reader = None
+    if _connection is not None:
+        await _connection.close()
+        _connection = None
+
+
+def _run_hooks(job):
+    for hook in job["hooks"]:
+        hook()
+
+
+def _finish(batch, error=None):
+    for job in batch:
+        if error is not None:
+            _run_hooks(job)
+            if not job["start"].done():
+                job["start"].set_exception(error)
+        if not job["finished"].done():
+            if error is None:
+                job["finished"].set_result(None)
+            else:
+                job["finished"].set_exception(error)
+
+
+async def _run_job(conn, job, batch):
+    if job["start"].cancelled():
+        return
+    await conn.execute("SAVEPOINT job")
+    # The caller can be cancelled while the savepoint is being opened; it
+    # never ran, so there is nothing to keep or roll back.
+    if job["start"].cancelled():
+        await conn.execute("RELEASE job")
+        return
+    job["start"].set_result(conn)
+    if await job["done"]:
+        await conn.execute("RELEASE job")
+        batch.append(job)
+    else:
+        await conn.execute("ROLLBACK TO job")
+        await conn.execute("RELEASE job")
+        _run_hooks(job)
+        if not job["finished"].done():
+            job["finished"].set_result(None)
+
+
+async def _run_batch(conn, job):
+    # Every transaction() body in the batch runs in its own savepoint, so a
+    # failing one rolls back alone while the rest share one commit.
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + _group_commit_window
+    batch = []
+    try:
+        if not conn.in_transaction:
+            await conn.execute("BEGIN IMMEDIATE")
+        while job is not None:
+            await _run_job(conn, job, batch)
+            if len(batch) >= GROUP_COMMIT_MAX_JOBS:
+                break
+            try:
+                job = _queue.get_nowait()
+            except asyncio.QueueEmpty:
+                try:
+                    job = await asyncio.wait_for(
+                        _queue.get(), max(deadline - loop.time(), 0)
+                    )
+                except asyncio.TimeoutError:
+                    job = None
+        start = time.perf_counter()
+        await conn.commit()
+        # The writer task runs outside any command; every transaction in the
+        # batch waited on this commit, so each of their commands pays for it.
+        record_query(
+            "COMMIT",
+            time.perf_counter() - start,
+            [job["invocation"] for job in batch],
+        )
+    except BaseException as e:
+        await conn.rollback()
+        if job is not None and job not in batch:
+            batch.append(job)
+        _finish(batch, e if isinstance(e, Exception) else RuntimeError(str(e)))
+        raise
+    _finish(batch)
+
+
+async def _write_loop(conn):
+    while True:
+        job = await _queue.get()
+        try:
+            await _run_batch(conn, job)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"Error committing write batch: {e}")
+
+
+async def _start_writer():
+    global _writer, _queue
+    if _writer is None or _writer.done():
+        _queue = asyncio.Queue()
+        _writer = asyncio.get_running_loop().create_task(
+            _write_loop(await get_connection())
+        )
+
+
+@asynccontextmanager
+async def transaction():
+    if _rollback_hooks.get() is not None:
+        yield await get_connection()
+        return
+    await _start_writer()
+    loop = asyncio.get_running_loop()
+    job = {
+        "start": loop.create_future(),
+        "done": loop.create_future(),
+        "finished": loop.create_future(),
+        "hooks": [],
+        "invocation": current_invocation(),
+    }
+    await _queue.put(job)
+    try:
+        conn = await job["start"]
+    except asyncio.CancelledError:
+        # The writer may already have handed us the savepoint.
+        if job["start"].done() and not job["start"].cancelled():
+            job["done"].set_result(False)
+        raise
+    token = _rollback_hooks.set(job["hooks"])
+    try:
+        yield conn
+    except BaseException:
+        if not job["done"].done():
+            job["done"].set_result(False)
+        await asyncio.shield(job["finished"])
+        raise
+    finally:
+        _rollback_hooks.reset(token)
+    if not job["done"].done():
+        job["done"].set_result(True)
+    await job["finished"]
+
+
+def on_rollback(hook):
+    hooks = _rollback_hooks.get()
+    if hooks is not None:
+        hooks.append(hook)
+
+
+async def execute(sql, params=()):
+    conn = await get_connection()
+    start = time.perf_counter()
+    cur = await conn.execute(sql, params)
+    rowcount, lastrowid = cur.rowcount, cur.lastrowid
+    await cur.close()
+    record_query(sql, time.perf_counter() - start)
+    return rowcount, lastrowid
+
+
+async def executemany(sql, seq_of_params):
+    conn = await get_connection()
+    start = time.perf_counter()
+    cur = await conn.executemany(sql, seq_of_params)
+    rowcount = cur.rowcount
+    await cur.close()
+    record_query(sql, time.perf_counter() - start)
+    return rowcount
+
+
+async def fetch_one(sql, params=()):
+    conn = await _read_connection()
+    start = time.perf_counter()
+    cur = await conn.execute(sql, params)
+    row = await cur.fetchone()
+    await cur.close()
+    record_query(sql, time.perf_counter() - start)
+    return row
+
+
+async def fetch_all(sql, params=()):
+    conn = await _read_connection()
+    start = time.perf_counter()
+    cur = await conn.execute(sql, params)
+    rows = await cur.fetchall()
+    await cur.close()
+    record_query(sql, time.perf_counter() - start)
+    return rows
+
+
+async def iterate(sql, params=(), batch_size=1000):
+    conn = await _read_connection()
+    # Only the time spent inside SQLite counts, not the consumer's work
+    # between batches.
+    start = time.perf_counter()
+    cur = await conn.execute(sql, params)
+    elapsed = time.perf_counter() - start
+    try:
+        while True:
+            start = time.perf_counter()
+            rows = await cur.fetchmany(batch_size)
+            elapsed += time.perf_counter() - start
+            if not rows:
+                break
+            for row in rows:
+                yield row
+    finally:
+        await cur.close()
+        record_query(sql, elapsed)
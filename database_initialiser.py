@@ -1,11 +1,12 @@
-from datetime import datetime
-import os
-import shutil
+from backup import snapshot
 from constants import (
     DATABASE_STRUCTURE,
     DATABASE_STRUCTURE_CREATIONSTRINGMAPPING,
+    DEFAULT_GROUP_ALIASES,
     SQLITEFILE,
 )
+from database_connection import connect_sync
+from logic import canonical_group_key
 
 
 import sqlite3
@@ -14,7 +15,7 @@ import sqlite3
 def check_database_structure(db_file):
 
     try:
-        conn = sqlite3.connect(db_file)
+        conn = connect_sync(db_file)
         c = conn.cursor()
 
         c.execute("SELECT name FROM sqlite_master WHERE type='table';")
@@ -73,6 +74,25 @@ def check_database_structure(db_file):
                                 }
                             )
 
+        c.execute(
+            "SELECT name, tbl_name, sql FROM sqlite_master WHERE type='index' AND sql IS NOT NULL;"
+        )
+        actual_indexes = {row[0]: (row[1], row[2]) for row in c.fetchall()}
+        for index in DATABASE_STRUCTURE_CREATIONSTRINGMAPPING["Indexes"]:
+            table = _index_table(index)
+            if index not in actual_indexes:
+                print(f"Missing index on {table}: {index}")
+                missing.append({"type": "index", "table": table, "index": index})
+            elif _normalise_sql(actual_indexes[index][1]) != _normalise_sql(
+                _build_index_string(index)
+            ):
+                print(f"Changed index on {table}: {index}")
+                missing.append({"type": "index", "table": table, "index": index})
+        for index, (table, _) in actual_indexes.items():
+            if index not in DATABASE_STRUCTURE_CREATIONSTRINGMAPPING["Indexes"]:
+                print(f"Extra index on {table}: {index}")
+                extra.append({"type": "index", "table": table, "index": index})
+
         return missing, extra, wrong_type
     except sqlite3.Error as e:
         print(f"SQLite error: {e}")
@@ -93,9 +113,38 @@ def _build_table_string(table):
     return sqlstring
 
 
-def repair_db(reduced_missing, reduced_extra):
-    conn = sqlite3.connect(SQLITEFILE)
-    shutil.copy(SQLITEFILE, f"backup/{datetime.now().timestamp()}_{SQLITEFILE}")
+def _parse_index(index):
+    definition = DATABASE_STRUCTURE_CREATIONSTRINGMAPPING["Indexes"][index]
+    unique = definition.startswith("UNIQUE ")
+    if unique:
+        definition = definition[len("UNIQUE ") :]
+    table, columns = definition.split(" (", 1)
+    return unique, table, f"({columns}"
+
+
+def _index_table(index):
+    return _parse_index(index)[1]
+
+
+def _build_index_string(index):
+    unique, table, columns = _parse_index(index)
+    return f"CREATE {'UNIQUE ' if unique else ''}INDEX {index} ON {table} {columns}"
+
+
+def _normalise_sql(sqlstring):
+    return " ".join(sqlstring.replace("(", " ( ").replace(")", " ) ").split()).lower()
+
+
+def _create_indexes(c, table):
+    for index in DATABASE_STRUCTURE_CREATIONSTRINGMAPPING["Indexes"]:
+        if _index_table(index) == table:
+            c.execute(f"DROP INDEX IF EXISTS {index};")
+            c.execute(_build_index_string(index))
+
+
+def repair_db(reduced_missing, reduced_extra, db_file=SQLITEFILE):
+    conn = connect_sync(db_file)
+    snapshot(db_file, label="repair")
     for missed in reduced_missing:
         c = conn.cursor()
         table = missed["table"]
@@ -111,7 +160,14 @@ def repair_db(reduced_missing, reduced_extra):
                 c.execute(sqlstring)
                 conn.commit()
                 print(f"added {col} to {table}")
+            case "index":
+                index = missed["index"]
+                c.execute(f"DROP INDEX IF EXISTS {index};")
+                c.execute(_build_index_string(index))
+                conn.commit()
+                print(f"created {index} on {table}")
 
+    reduced_extra.sort(key=lambda ext: ext["type"] != "index")
     for ext in reduced_extra:
         c = conn.cursor()
         table = ext["table"]
@@ -127,6 +183,66 @@ def repair_db(reduced_missing, reduced_extra):
                 c.execute(sqlstring)
                 conn.commit
                 print(f"dropped {col} in {table}")
+            case "index":
+                index = ext["index"]
+                c.execute(f"DROP INDEX IF EXISTS {index};")
+                conn.commit()
+                print(f"dropped {index} on {table}")
+    conn.commit()
+    conn.close()
+
+
+def migrate_db(db_file=SQLITEFILE):
+    conn = connect_sync(db_file)
+    conn.create_function(
+        "canonical_group_key", 1, canonical_group_key, deterministic=True
+    )
+    c = conn.cursor()
+    c.execute(
+        """
+        UPDATE match_history
+        SET season_number = CAST(REPLACE(UPPER(season), 'SEASON ', '') AS INTEGER),
+            group_key = canonical_group_key(league)
+        WHERE season_number IS NULL OR group_key IS NULL
+        """
+    )
+    if c.rowcount > 0:
+        print(f"backfilled season_number/group_key for {c.rowcount} matches")
+    c.executemany(
+        "INSERT OR IGNORE INTO group_aliases (alias, group_key) VALUES (?, ?)",
+        DEFAULT_GROUP_ALIASES.items(),
+    )
+    c.execute(
+        """
+        INSERT OR IGNORE INTO groups (season_number, name, group_key)
+        SELECT season_number, group_name, canonical_group_key(group_name)
+        FROM pairings
+        WHERE group_id IS NULL AND group_name IS NOT NULL
+        GROUP BY season_number, canonical_group_key(group_name)
+        """
+    )
+    c.execute(
+        """
+        INSERT OR IGNORE INTO groups (season_number, name, group_key)
+        SELECT season_number, league, group_key
+        FROM match_history
+        WHERE season_number IS NOT NULL AND group_key IS NOT NULL
+        GROUP BY season_number, group_key
+        """
+    )
+    c.execute(
+        """
+        UPDATE pairings
+        SET group_id = (
+            SELECT id FROM groups
+            WHERE groups.season_number = pairings.season_number
+              AND groups.group_key = canonical_group_key(pairings.group_name)
+        )
+        WHERE group_id IS NULL AND group_name IS NOT NULL
+        """
+    )
+    if c.rowcount > 0:
+        print(f"backfilled group_id for {c.rowcount} pairings")
     conn.commit()
     conn.close()
 
@@ -136,28 +252,26 @@ def _reduce(list):
     for missed in list:
         if missed["type"] == "table":
             skip.append(missed["table"])
-        elif missed["table"] in skip:
+        elif missed["table"] in skip and missed["type"] != "index":
             continue
         reduced_list.append(missed)
 
     return reduced_list
 
 
-def init_db():
-    missing, extra, wrong_type = check_database_structure(SQLITEFILE)
+def init_db(db_file=SQLITEFILE):
+    missing, extra, wrong_type = check_database_structure(db_file)
 
     reduced_missing, reduced_extra = _reduce(missing), _reduce(extra)
-    if not os.path.exists("backup"):
-        os.makedirs("backup")
     if len(missing) + len(extra) > 0:
-        repair_db(reduced_missing, reduced_extra)
+        repair_db(reduced_missing, reduced_extra, db_file)
     if len(wrong_type) > 0:
         print(wrong_type)
         if input(
             "wrong prefered column types detected do you want to repair typestructure(yes/NO):"
         ).lower() in ["y", "yes"]:
-            conn = sqlite3.connect(SQLITEFILE)
-            shutil.copy(SQLITEFILE, f"backup/{datetime.now().timestamp()}_{SQLITEFILE}")
+            conn = connect_sync(db_file)
+            snapshot(db_file, label="repair")
             c = conn.cursor()
             for table in list({entry["table"] for entry in wrong_type}):
                 c.execute(f"ALTER TABLE {table} RENAME TO old_{table}")
@@ -168,4 +282,7 @@ def init_db():
                 conn.commit()
                 c.execute(f"DROP TABLE old_{table}")
                 conn.commit()
+                _create_indexes(c, table)
+                conn.commit()
             conn.close()
+    migrate_db(db_file)
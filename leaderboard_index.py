@@ -0,0 +1,96 @@
+from bisect import bisect_left, insort
+from collections import OrderedDict
+
+
+class EloIndex:
+    def __init__(self, rows=()):
+        self._keys = []
+        self._players = {}
+        for row in rows:
+            self._players[row["id"]] = dict(row)
+        self._keys = sorted((-p["elo"], pid) for pid, p in self._players.items())
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __contains__(self, player_id):
+        return player_id in self._players
+
+    def get(self, player_id):
+        return self._players.get(player_id)
+
+    def upsert(self, row):
+        player_id = row["id"]
+        self.remove(player_id)
+        self._players[player_id] = dict(row)
+        insort(self._keys, (-row["elo"], player_id))
+
+    def remove(self, player_id):
+        old = self._players.pop(player_id, None)
+        if old is not None:
+            i = bisect_left(self._keys, (-old["elo"], player_id))
+            del self._keys[i]
+
+    def count_above(self, elo):
+        return bisect_left(self._keys, (-elo, float("-inf")))
+
+    def slice(self, offset, count):
+        return [self._players[pid] for _, pid in self._keys[offset : offset + count]]
+
+    def top(self, count):
+        return self.slice(0, count)
+
+    def subset(self, player_ids):
+        return EloIndex(
+            self._players[pid] for pid in player_ids if pid in self._players
+        )
+
+
+class LRUCache:
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            return self._entries[key]
+        return None
+
+    def put(self, key, value):
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+
+class LeaderboardCache(LRUCache):
+    def __init__(self, max_entries=256):
+        super().__init__(max_entries)
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, key):
+        value = super().get(key)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+
+    def clear(self):
+        if self._entries:
+            self.invalidations += 1
+        super().clear()
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+            "entries": len(self._entries),
+        }
@@ -1,27 +1,42 @@
 import csv
 import math
 import os
-from constants import ROLES_CONFIG_FILE
+from itertools import combinations
+from constants import INACTIVITY_PENALTY, INITIAL_ELO, K_FACTOR, ROLES_CONFIG_FILE
+from partitioner import snake_partition, subgroup_sizes
 
 
 def get_expected_score(a, b):
     return 1 / (1 + math.pow(10, (b - a) / 400))
 
 
-def update_elo(winner_elo, loser_elo, draw=False):
+def update_elo(winner_elo, loser_elo, draw=False, k_factor=K_FACTOR):
     if draw:
         expected_winner = get_expected_score(winner_elo, loser_elo)
         expected_loser = get_expected_score(loser_elo, winner_elo)
-        new_winner_elo = winner_elo + 25 * (0.5 - expected_winner)
-        new_loser_elo = loser_elo + 25 * (0.5 - expected_loser)
+        new_winner_elo = winner_elo + k_factor * (0.5 - expected_winner)
+        new_loser_elo = loser_elo + k_factor * (0.5 - expected_loser)
         return new_winner_elo, new_loser_elo
     else:
         expected = get_expected_score(winner_elo, loser_elo)
-        new_winner_elo = winner_elo + 25 * (1 - expected)
-        new_loser_elo = loser_elo - 25 * (1 - expected)
+        new_winner_elo = winner_elo + k_factor * (1 - expected)
+        new_loser_elo = loser_elo - k_factor * (1 - expected)
         return new_winner_elo, new_loser_elo
 
 
+def penalised_elo(elo, amount=INACTIVITY_PENALTY, floor=INITIAL_ELO):
+    if elo - floor > amount:
+        return elo - amount
+    return floor
+
+
+def find_role(elo, role_ranges):
+    for role_range in role_ranges:
+        if role_range["min"] <= elo <= role_range["max"]:
+            return role_range["name"]
+    return None
+
+
 def get_role_ranges():
     role_ranges = []
     if os.path.exists(ROLES_CONFIG_FILE):
@@ -52,15 +67,58 @@ def get_role_ranges():
 def group_players(players, role_ranges):
     groups = {}
     for player_id, elo in players:
-        for role_range in role_ranges:
-            if role_range["min"] <= elo <= role_range["max"]:
-                if role_range["name"] not in groups:
-                    groups[role_range["name"]] = []
-                groups[role_range["name"]].append(player_id)
-                break
+        role = find_role(elo, role_ranges)
+        if role is not None:
+            groups.setdefault(role, []).append((player_id, elo))
     return groups
 
 
+def plan_subgroups(players, role_ranges, seed=None):
+    subgroups = {}
+    for group_name, members in group_players(players, role_ranges).items():
+        if len(members) > 7:
+            sizes = subgroup_sizes(len(members))
+            for i, player_ids in enumerate(snake_partition(members, sizes, seed)):
+                subgroups[f"{group_name}-{i + 1}"] = player_ids
+        else:
+            subgroups[group_name] = [player_id for player_id, _elo in members]
+    return subgroups
+
+
+def plan_pairings(subgroups):
+    return [
+        (p1, p2, subgroup_name)
+        for subgroup_name, player_ids in subgroups.items()
+        for p1, p2 in combinations(player_ids, 2)
+    ]
+
+
+def canonical_group_key(group_name):
+    if group_name is None:
+        return None
+    key = " ".join(str(group_name).lower().split())
+    if len(key) > 2 and key[-2] == "-" and key[-1].isalpha():
+        key = f"{key[:-1]}{ord(key[-1]) - ord('a') + 1}"
+    return key
+
+
+def sparkline(values, width=40):
+    if not values:
+        return ""
+    if len(values) > width:
+        step = len(values) / width
+        values = [
+            values[min(len(values) - 1, int((i + 1) * step) - 1)] for i in range(width)
+        ]
+    low, high = min(values), max(values)
+    bars = "▁▂▃▄▅▆▇█"
+    if high == low:
+        return bars[3] * len(values)
+    return "".join(
+        bars[round((value - low) / (high - low) * (len(bars) - 1))] for value in values
+    )
+
+
 def calculate_sb(leaderboard):
     lookup = {player["id"]: player for player in leaderboard}
     for player in leaderboard:
@@ -72,20 +130,20 @@ def calculate_sb(leaderboard):
     return leaderboard
 
 
-def calculate_match_stats(game1, game2, p1_elo, p2_elo):
+def calculate_match_stats(game1, game2, p1_elo, p2_elo, k_factor=K_FACTOR):
     if game1 == 0.5:
-        g1_p1, g1_p2 = update_elo(p1_elo, p2_elo, draw=True)
+        g1_p1, g1_p2 = update_elo(p1_elo, p2_elo, draw=True, k_factor=k_factor)
     elif game1 == 1.0:
-        g1_p1, g1_p2 = update_elo(p1_elo, p2_elo)
+        g1_p1, g1_p2 = update_elo(p1_elo, p2_elo, k_factor=k_factor)
     else:
-        g1_p2, g1_p1 = update_elo(p2_elo, p1_elo)
+        g1_p2, g1_p1 = update_elo(p2_elo, p1_elo, k_factor=k_factor)
 
     if game2 == 0.5:
-        g2_p1, g2_p2 = update_elo(g1_p1, g1_p2, draw=True)
+        g2_p1, g2_p2 = update_elo(g1_p1, g1_p2, draw=True, k_factor=k_factor)
     elif game2 == 1.0:
-        g2_p1, g2_p2 = update_elo(g1_p1, g1_p2)
+        g2_p1, g2_p2 = update_elo(g1_p1, g1_p2, k_factor=k_factor)
     else:
-        g2_p2, g2_p1 = update_elo(g1_p2, g1_p1)
+        g2_p2, g2_p1 = update_elo(g1_p2, g1_p1, k_factor=k_factor)
 
     p1_wins = sum(1 for r in [game1, game2] if (r == 1.0))
     p1_losses = 2 - p1_wins - sum(1 for r in [game1, game2] if r == 0.5)
@@ -0,0 +1,32 @@
+import math
+import random
+
+SUBGROUP_SIZE = 6
+
+
+def subgroup_sizes(count, target=SUBGROUP_SIZE):
+    if count <= 0:
+        return []
+    groups = math.ceil(count / target)
+    size, larger = divmod(count, groups)
+    return [size + 1] * larger + [size] * (groups - larger)
+
+
+def snake_partition(players, sizes, seed=None):
+    # players are (player_id, elo) pairs. Strongest first, dealt across the
+    # groups left to right and back again so every group gets one player from
+    # each tier. With a seed the players within a tier are shuffled.
+    ordered = sorted(players, key=lambda player: (-player[1], player[0]))
+    rng = random.Random(seed) if seed is not None else None
+    groups = [[] for _ in sizes]
+    width = len(sizes)
+    for start in range(0, len(ordered), width):
+        tier = ordered[start : start + width]
+        if rng is not None:
+            rng.shuffle(tier)
+        forward = (start // width) % 2 == 0
+        order = range(width) if forward else range(width - 1, -1, -1)
+        slots = [i for i in order if len(groups[i]) < sizes[i]]
+        for (player_id, _elo), i in zip(tier, slots):
+            groups[i].append(player_id)
+    return groups
@@ -0,0 +1,137 @@
+import re
+import time
+from collections import deque
+from contextvars import ContextVar
+
+MAX_SAMPLES = 2000
+SLOWEST_KEPT = 10
+
+_invocation = ContextVar("invocation", default=None)
+_commands = {}
+_queries = {}
+_slowest = []
+started = time.time()
+
+
+def _command(name):
+    stats = _commands.get(name)
+    if stats is None:
+        stats = _commands[name] = {
+            "calls": 0,
+            "errors": 0,
+            "samples": deque(maxlen=MAX_SAMPLES),
+            "total_seconds": 0.0,
+            "sql_seconds": 0.0,
+            "queries": 0,
+        }
+    return stats
+
+
+def start_command(name):
+    _invocation.set(
+        {"name": name, "start": time.perf_counter(), "sql_seconds": 0.0, "queries": 0}
+    )
+
+
+def finish_command(failed=False):
+    invocation = _invocation.get()
+    if invocation is None:
+        return
+    _invocation.set(None)
+    stats = _command(invocation["name"])
+    elapsed = time.perf_counter() - invocation["start"]
+    stats["calls"] += 1
+    stats["samples"].append(elapsed)
+    stats["total_seconds"] += elapsed
+    stats["sql_seconds"] += invocation["sql_seconds"]
+    stats["queries"] += invocation["queries"]
+    if failed:
+        stats["errors"] += 1
+
+
+def record_error(name):
+    _command(name)["errors"] += 1
+
+
+def _normalise(sql):
+    return re.sub(r"\s+", " ", sql).strip()
+
+
+def current_invocation():
+    return _invocation.get()
+
+
+def record_query(sql, seconds, invocations=None):
+    # invocations lists the command invocations the time is charged to, by
+    # default whichever one is running in the current context.
+    if invocations is None:
+        invocations = [_invocation.get()]
+    invocations = [invocation for invocation in invocations if invocation]
+    for invocation in invocations:
+        invocation["sql_seconds"] += seconds
+        invocation["queries"] += 1
+    command = (
+        ", ".join(sorted({invocation["name"] for invocation in invocations})) or None
+    )
+
+    sql = _normalise(sql)
+    stats = _queries.get(sql)
+    if stats is None:
+        stats = _queries[sql] = {"count": 0, "total": 0.0, "max": 0.0}
+    stats["count"] += 1
+    stats["total"] += seconds
+    stats["max"] = max(stats["max"], seconds)
+
+    if len(_slowest) < SLOWEST_KEPT or seconds > _slowest[-1][0]:
+        _slowest.append((seconds, sql, command))
+        _slowest.sort(key=lambda entry: entry[0], reverse=True)
+        del _slowest[SLOWEST_KEPT:]
+
+
+def percentile(ordered, fraction):
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+def command_report():
+    report = []
+    for name, stats in _commands.items():
+        ordered = sorted(stats["samples"])
+        report.append(
+            {
+                "command": name,
+                "calls": stats["calls"],
+                "errors": stats["errors"],
+                "p50": percentile(ordered, 0.50),
+                "p95": percentile(ordered, 0.95),
+                "p99": percentile(ordered, 0.99),
+                "sql_share": min(
+                    stats["sql_seconds"] / max(stats["total_seconds"], 1e-9), 1
+                ),
+                "queries": stats["queries"],
+            }
+        )
+    report.sort(key=lambda entry: entry["p95"], reverse=True)
+    return report
+
+
+def slowest_queries():
+    return [
+        {"seconds": seconds, "sql": sql, "command": command}
+        for seconds, sql, command in _slowest
+    ]
+
+
+def query_report(limit=10):
+    report = [{"sql": sql, **stats} for sql, stats in _queries.items()]
+    report.sort(key=lambda entry: entry["total"], reverse=True)
+    return report[:limit]
+
+
+def reset():
+    global started
+    _commands.clear()
+    _queries.clear()
+    _slowest.clear()
+    started = time.time()
@@ -0,0 +1,222 @@
+import asyncio
+from collections import deque
+
+import numpy as np
+
+from constants import INITIAL_ELO, K_FACTOR
+from database import invalidate_rating_caches
+from database_connection import execute, executemany, fetch_all, iterate, transaction
+from logic import penalised_elo
+
+MATCH_QUERY = """
+    SELECT m.match, m.whiteplayer, m.blackplayer, m.colorwon, m.season_number,
+           m.group_key, p.player1_id
+    FROM match_history m
+    LEFT JOIN pairings p
+      ON p.season_number = m.season_number
+     AND ((p.player1_id = m.whiteplayer AND p.player2_id = m.blackplayer)
+       OR (p.player1_id = m.blackplayer AND p.player2_id = m.whiteplayer))
+    ORDER BY m.match
+"""
+PENALTY_QUERY = """
+    SELECT after_match, player_id, amount, floor FROM penalties ORDER BY after_match, id
+"""
+
+
+async def load_events():
+    # The bot only rates a pairing once both of its games are confirmed, so
+    # games are buffered until their partner game shows up in match_history.
+    # Penalties are placed by the last match recorded when they were given,
+    # as (number of events before it, player, amount, floor).
+    pending = {}
+    events = []
+    queued = deque(tuple(row) for row in await fetch_all(PENALTY_QUERY))
+    penalties = []
+    async for match, white, black, colorwon, season, group_key, player1 in iterate(
+        MATCH_QUERY
+    ):
+        while queued and queued[0][0] < match:
+            penalties.append((len(events),) + queued.popleft()[1:])
+        white_score = {"w": 1.0, "b": 0.0, "d": 0.5}[colorwon]
+        key = (season, group_key, min(white, black), max(white, black))
+        first = pending.pop(key, None)
+        if player1 is None:
+            player1 = first["p1"] if first else white
+        player2 = black if white == player1 else white
+        game = {
+            "p1": player1,
+            "p2": player2,
+            "number": 1 if white == player1 else 2,
+            "score": white_score if white == player1 else 1 - white_score,
+        }
+        if first is None:
+            pending[key] = game
+            continue
+        game1, game2 = sorted((first, game), key=lambda g: g["number"])
+        events.append((player1, player2, game1["score"], game2["score"]))
+    penalties += [(len(events),) + penalty[1:] for penalty in queued]
+    return events, penalties
+
+
+def _batch_bounds(events, breaks=()):
+    # Consecutive events that share no player commute, so each run of them
+    # can be rated in one vectorised step. A batch also ends wherever a
+    # penalty is due.
+    bounds, seen = [0], set()
+    for i, (p1, p2, _, _) in enumerate(events):
+        if p1 in seen or p2 in seen or i in breaks:
+            bounds.append(i)
+            seen = set()
+        seen.update((p1, p2))
+    bounds.append(len(events))
+    return list(zip(bounds, bounds[1:]))
+
+
+def replay_events(
+    events,
+    penalties=(),
+    player_ids=(),
+    k_factor=K_FACTOR,
+    initial_elo=INITIAL_ELO,
+    with_predictions=False,
+):
+    ids = sorted(
+        set(player_ids)
+        | {p for event in events for p in event[:2]}
+        | {penalty[1] for penalty in penalties}
+    )
+    slot = {player_id: i for i, player_id in enumerate(ids)}
+    elo = np.full(len(ids), float(initial_elo))
+    wins = np.zeros(len(ids), dtype=np.int64)
+    losses = np.zeros(len(ids), dtype=np.int64)
+    draws = np.zeros(len(ids), dtype=np.int64)
+
+    a = np.fromiter((slot[e[0]] for e in events), dtype=np.int64, count=len(events))
+    b = np.fromiter((slot[e[1]] for e in events), dtype=np.int64, count=len(events))
+    g1 = np.fromiter((e[2] for e in events), dtype=float, count=len(events))
+    g2 = np.fromiter((e[3] for e in events), dtype=float, count=len(events))
+    p1_wins = (g1 == 1.0).astype(np.int64) + (g2 == 1.0)
+    p1_draws = (g1 == 0.5).astype(np.int64) + (g2 == 0.5)
+    p1_losses = 2 - p1_wins - p1_draws
+    history_elo = np.empty(2 * len(events))
+    expected_scores = np.empty(2 * len(events))
+
+    due = {}
+    for index, player_id, amount, floor in penalties:
+        due.setdefault(index, []).append((slot[player_id], amount, floor))
+    penalty_history = []
+
+    def penalise(index):
+        for i, amount, floor in due.get(index, ()):
+            elo[i] = penalised_elo(elo[i], amount, floor)
+            penalty_history.append((index, ids[i], float(elo[i])))
+
+    for start, end in _batch_bounds(events, due):
+        penalise(start)
+        ia, ib = a[start:end], b[start:end]
+        ra, rb = elo[ia], elo[ib]
+        for game, score in enumerate((g1[start:end], g2[start:end])):
+            expected = 1 / (1 + np.power(10, (rb - ra) / 400))
+            expected_scores[2 * start + game : 2 * end : 2] = expected
+            delta = k_factor * (score - expected)
+            ra, rb = ra + delta, rb - delta
+        elo[ia], elo[ib] = ra, rb
+        history_elo[2 * start : 2 * end : 2] = ra
+        history_elo[2 * start + 1 : 2 * end : 2] = rb
+    penalise(len(events))
+
+    np.add.at(wins, a, p1_wins)
+    np.add.at(wins, b, p1_losses)
+    np.add.at(losses, a, p1_losses)
+    np.add.at(losses, b, p1_wins)
+    np.add.at(draws, a, p1_draws)
+    np.add.at(draws, b, p1_draws)
+
+    history_players = np.empty(2 * len(events), dtype=np.int64)
+    history_players[0::2] = [e[0] for e in events]
+    history_players[1::2] = [e[1] for e in events]
+    players = {
+        player_id: {
+            "elo": float(elo[i]),
+            "wins": int(wins[i]),
+            "losses": int(losses[i]),
+            "draws": int(draws[i]),
+        }
+        for player_id, i in slot.items()
+    }
+    matches = list(zip(history_players.tolist(), history_elo.tolist()))
+    history, done = [], 0
+    for index, player_id, player_elo in penalty_history:
+        history += matches[done : 2 * index]
+        history.append((player_id, player_elo))
+        done = 2 * index
+    history += matches[done:]
+    result = {"players": players, "history": history}
+    if with_predictions:
+        actual_scores = np.empty(2 * len(events))
+        actual_scores[0::2], actual_scores[1::2] = g1, g2
+        result["predictions"] = (expected_scores, actual_scores)
+    return result
+
+
+async def replay_history(k_factor=K_FACTOR, initial_elo=INITIAL_ELO):
+    player_ids = [row["id"] for row in await fetch_all("SELECT id FROM players")]
+    events, penalties = await load_events()
+    # Years of history take seconds; keep the event loop (and the gateway
+    # heartbeat) running meanwhile.
+    return await asyncio.to_thread(
+        replay_events, events, penalties, player_ids, k_factor, initial_elo
+    )
+
+
+async def diff_against_players(result, tolerance=0.01):
+    diffs = []
+    live = await fetch_all("SELECT id, elo, wins, losses, draws FROM players")
+    for row in live:
+        replayed = result["players"].get(row["id"])
+        if replayed is None:
+            continue
+        if (
+            abs(row["elo"] - replayed["elo"]) > tolerance
+            or row["wins"] != replayed["wins"]
+            or row["losses"] != replayed["losses"]
+            or row["draws"] != replayed["draws"]
+        ):
+            diffs.append({"id": row["id"], "live": dict(row), "replay": replayed})
+    diffs.sort(key=lambda d: abs(d["live"]["elo"] - d["replay"]["elo"]), reverse=True)
+    return diffs
+
+
+async def apply_replay(result):
+    async with transaction():
+        timestamps = {}
+        for player_id, timestamp in await fetch_all(
+            "SELECT player_id, timestamp FROM elo_history ORDER BY id"
+        ):
+            timestamps.setdefault(player_id, []).append(timestamp)
+
+        # Keep the original timestamps: a player's k-th replayed update is
+        # their k-th live update.
+        seen = {}
+        history = []
+        for player_id, elo in result["history"]:
+            k = seen.get(player_id, 0)
+            seen[player_id] = k + 1
+            player_timestamps = timestamps.get(player_id, [])
+            timestamp = player_timestamps[k] if k < len(player_timestamps) else None
+            history.append((player_id, elo, timestamp))
+
+        await execute("DELETE FROM elo_history")
+        await executemany(
+            """INSERT INTO elo_history (player_id, elo_change, timestamp)
+                 VALUES (?, ?, COALESCE(?, CURRENT_TIMESTAMP))""",
+            history,
+        )
+        await executemany(
+            "UPDATE players SET elo=?, wins=?, losses=?, draws=? WHERE id=?",
+            [
+                (p["elo"], p["wins"], p["losses"], p["draws"], player_id)
+                for player_id, p in result["players"].items()
+            ],
+        )
+    invalidate_rating_caches()
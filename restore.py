@@ -0,0 +1,28 @@
+import argparse
+import os
+
+from backup import delta_chain, restore
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Rebuild a database from a base snapshot and its delta backups"
+    )
+    parser.add_argument("base", help="gzipped snapshot the deltas were taken against")
+    parser.add_argument(
+        "deltas",
+        nargs="*",
+        help="delta files to apply, by default every delta next to the base",
+    )
+    parser.add_argument("--output", default="restored.db")
+    args = parser.parse_args()
+
+    if os.path.exists(args.output):
+        raise SystemExit(f"{args.output} already exists, not overwriting it")
+    deltas = args.deltas or delta_chain(args.base)
+    applied = restore(args.base, args.output, deltas)
+    print(f"restored {args.output} from {args.base} and {applied} deltas")
+
+
+if __name__ == "__main__":
+    main()
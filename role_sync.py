@@ -0,0 +1,93 @@
+import asyncio
+
+import discord
+
+MAX_CONCURRENT_EDITS = 5
+MAX_RETRIES = 4
+
+
+def plan_role_changes(members, desired_roles, league_roles):
+    league_role_ids = {role.id for role in league_roles}
+    plans = []
+    for player_id, target in desired_roles.items():
+        member = members.get(player_id)
+        if member is None:
+            continue
+        current = {role.id for role in member.roles if role.id in league_role_ids}
+        wanted = {target.id} if target is not None else set()
+        if current == wanted:
+            continue
+        roles = [
+            role
+            for role in member.roles
+            if role.id not in league_role_ids and not role.is_default()
+        ]
+        if target is not None:
+            roles.append(target)
+        plans.append(
+            {
+                "member": member,
+                "roles": roles,
+                "added": len(wanted - current),
+                "removed": len(current - wanted),
+            }
+        )
+    return plans
+
+
+def legacy_call_count(desired_roles, members, league_roles):
+    # What the old loop spent: a fetch_member per player, then a remove_roles
+    # call whenever any league role was held and an add_roles per ranked player.
+    league_role_ids = {role.id for role in league_roles}
+    calls = 0
+    for player_id, target in desired_roles.items():
+        calls += 1
+        member = members.get(player_id)
+        if member is None:
+            continue
+        if any(role.id in league_role_ids for role in member.roles):
+            calls += 1
+        if target is not None:
+            calls += 1
+    return calls
+
+
+async def _edit_roles(member, roles, semaphore, stats):
+    for attempt in range(MAX_RETRIES):
+        async with semaphore:
+            try:
+                stats["calls"] += 1
+                await member.edit(roles=roles, reason="League role sync")
+                return True
+            except discord.HTTPException as e:
+                if e.status != 429 and e.status < 500:
+                    raise
+                stats["retries"] += 1
+                retry_after = getattr(e, "retry_after", None) or 2**attempt
+        await asyncio.sleep(retry_after)
+    return False
+
+
+async def apply_role_changes(plans, concurrency=MAX_CONCURRENT_EDITS, progress=None):
+    semaphore = asyncio.Semaphore(concurrency)
+    stats = {"calls": 0, "retries": 0, "updated": 0, "failed": 0}
+    done = 0
+
+    async def run(plan):
+        nonlocal done
+        try:
+            if await _edit_roles(plan["member"], plan["roles"], semaphore, stats):
+                stats["updated"] += 1
+            else:
+                stats["failed"] += 1
+        except discord.Forbidden:
+            raise
+        except discord.HTTPException as e:
+            print(f"HTTP Error updating {plan['member'].id}: {e}")
+            stats["failed"] += 1
+        done += 1
+        if progress is not None:
+            await progress(done, len(plans))
+
+    await asyncio.gather(*(run(plan) for plan in plans))
+    return stats
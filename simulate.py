@@ -0,0 +1,113 @@
+import argparse
+import asyncio
+import json
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from itertools import product
+
+import numpy as np
+
+import database_connection
+from constants import INITIAL_ELO, K_FACTOR, SQLITEFILE
+from logic import find_role, get_role_ranges
+from replay import load_events, replay_events
+
+_events = None
+_penalties = None
+_player_ids = None
+
+
+async def _load_history(db_file):
+    await database_connection.connect(db_file)
+    try:
+        events, penalties = await load_events()
+        rows = await database_connection.fetch_all("SELECT id FROM players")
+    finally:
+        await database_connection.close()
+    return events, penalties, [row["id"] for row in rows]
+
+
+def _init_worker(events, penalties, player_ids):
+    global _events, _penalties, _player_ids
+    _events, _penalties, _player_ids = events, penalties, player_ids
+
+
+def evaluate(k_factor, initial_elo, role_ranges):
+    result = replay_events(
+        _events,
+        _penalties,
+        _player_ids,
+        k_factor,
+        initial_elo,
+        with_predictions=True,
+    )
+    expected, actual = result["predictions"]
+    clipped = np.clip(expected, 1e-12, 1 - 1e-12)
+    log_loss = -np.mean(actual * np.log(clipped) + (1 - actual) * np.log(1 - clipped))
+    brier = np.mean((expected - actual) ** 2)
+    roles = Counter(
+        find_role(player["elo"], role_ranges) or "No role"
+        for player in result["players"].values()
+    )
+    return {
+        "k_factor": k_factor,
+        "initial_elo": initial_elo,
+        "games": int(len(actual)),
+        "log_loss": float(log_loss) if len(actual) else None,
+        "brier": float(brier) if len(actual) else None,
+        "roles": dict(roles),
+    }
+
+
+def simulate(events, penalties, player_ids, k_factors, initial_elos, workers=None):
+    role_ranges = get_role_ranges()
+    grid = list(product(k_factors, initial_elos))
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_init_worker,
+        initargs=(events, penalties, player_ids),
+    ) as pool:
+        return list(
+            pool.map(
+                evaluate,
+                [k for k, _ in grid],
+                [initial for _, initial in grid],
+                [role_ranges] * len(grid),
+            )
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Replay match history under different K factors and starting ratings"
+    )
+    parser.add_argument("--db", default=SQLITEFILE)
+    parser.add_argument(
+        "--k", type=float, nargs="+", default=[16, 20, K_FACTOR, 32, 40]
+    )
+    parser.add_argument("--initial", type=float, nargs="+", default=[INITIAL_ELO])
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    events, penalties, player_ids = asyncio.run(_load_history(args.db))
+    results = simulate(
+        events, penalties, player_ids, args.k, args.initial, args.workers
+    )
+
+    print(f"{len(events)} rated pairings, {len(player_ids)} players")
+    for r in sorted(results, key=lambda r: (r["log_loss"] is None, r["log_loss"])):
+        roles = ", ".join(
+            f"{name}: {count}" for name, count in sorted(r["roles"].items())
+        )
+        print(
+            f"K={r['k_factor']:g} initial={r['initial_elo']:g} | "
+            f"log-loss {r['log_loss'] or 0:.4f} | Brier {r['brier'] or 0:.4f} | {roles}"
+        )
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+import asyncio
+
+import pytest
+
+import database_connection
+import perf
+from database_connection import execute, fetch_all, transaction
+
+
+@pytest.fixture
+def db_file(tmp_path):
+    database_connection.configure(profile="default")
+    return str(tmp_path / "test.db")
+
+
+def test_cancel_while_savepoint_opens_keeps_other_jobs(db_file):
+    async def scenario():
+        conn = await database_connection.connect(db_file)
+        await conn.execute("CREATE TABLE t (name TEXT)")
+        await conn.commit()
+
+        entered = asyncio.Event()
+        release = asyncio.Event()
+        tasks = {}
+
+        async def first():
+            async with transaction():
+                await execute("INSERT INTO t VALUES ('a')")
+                entered.set()
+                await release.wait()
+
+        async def second():
+            async with transaction():
+                await execute("INSERT INTO t VALUES ('b')")
+
+        # Cancel the second caller exactly while the writer opens its
+        # savepoint, after the writer checked it was still waiting.
+        original = conn.execute
+        savepoints = 0
+
+        def cancelling_execute(sql, *args):
+            nonlocal savepoints
+            if sql == "SAVEPOINT job":
+                savepoints += 1
+                if savepoints == 2:
+                    tasks["second"].cancel()
+            return original(sql, *args)
+
+        conn.execute = cancelling_execute
+        try:
+            tasks["first"] = asyncio.create_task(first())
+            await entered.wait()
+            tasks["second"] = asyncio.create_task(second())
+            await asyncio.sleep(0)
+            release.set()
+            await tasks["first"]
+            with pytest.raises(asyncio.CancelledError):
+                await tasks["second"]
+
+            async with transaction():
+                await execute("INSERT INTO t VALUES ('c')")
+            return [
+                row[0] for row in await fetch_all("SELECT name FROM t ORDER BY name")
+            ]
+        finally:
+            conn.execute = original
+            await database_connection.close()
+
+    assert asyncio.run(scenario()) == ["a", "c"]
+
+
+def test_commit_is_charged_to_the_command_that_waited_on_it(db_file):
+    async def command(name):
+        perf.start_command(name)
+        async with transaction():
+            await execute("INSERT INTO t VALUES (?)", (name,))
+        perf.finish_command()
+
+    async def scenario():
+        conn = await database_connection.connect(db_file)
+        await conn.execute("CREATE TABLE t (name TEXT)")
+        await conn.commit()
+        try:
+            # The writer task starts inside the first command and keeps its
+            # context, the second command's commit must still be its own.
+            await asyncio.create_task(command("first"))
+            await asyncio.create_task(command("second"))
+        finally:
+            await database_connection.close()
+
+    perf.reset()
+    asyncio.run(scenario())
+    report = {entry["command"]: entry for entry in perf.command_report()}
+    assert report["first"]["queries"] == 2
+    assert report["second"]["queries"] == 2
+    commits = [entry for entry in perf.slowest_queries() if entry["sql"] == "COMMIT"]
+    assert sorted(entry["command"] for entry in commits) == ["first", "second"]
+
+
+def test_reads_outside_a_transaction_only_see_committed_rows(tmp_path):
+    database_connection.configure(profile="wal")
+    db_file = str(tmp_path / "test.db")
+
+    async def scenario():
+        conn = await database_connection.connect(db_file)
+        await conn.execute("CREATE TABLE t (name TEXT)")
+        await conn.commit()
+        inserted = asyncio.Event()
+        release = asyncio.Event()
+
+        async def failing_write():
+            async with transaction():
+                await execute("INSERT INTO t VALUES ('a')")
+                inserted.set()
+                await release.wait()
+                raise ValueError
+
+        try:
+            task = asyncio.create_task(failing_write())
+            await inserted.wait()
+            during = await fetch_all("SELECT name FROM t")
+            release.set()
+            with pytest.raises(ValueError):
+                await task
+            return len(during), len(await fetch_all("SELECT name FROM t"))
+        finally:
+            await database_connection.close()
+            database_connection.configure(profile="default")
+
+    assert asyncio.run(scenario()) == (0, 0)
@@ -0,0 +1,48 @@
+import sqlite3
+
+from constants import DATABASE_STRUCTURE_CREATIONSTRINGMAPPING
+from database_initialiser import (
+    _create_indexes,
+    _index_table,
+    check_database_structure,
+    init_db,
+)
+
+
+def _indexes(db_file, table):
+    conn = sqlite3.connect(db_file)
+    try:
+        return {
+            name
+            for (name,) in conn.execute(
+                "SELECT name FROM sqlite_master WHERE type='index' AND tbl_name=? AND sql IS NOT NULL",
+                (table,),
+            )
+        }
+    finally:
+        conn.close()
+
+
+def test_unique_indexes_belong_to_their_table():
+    indexes = DATABASE_STRUCTURE_CREATIONSTRINGMAPPING["Indexes"]
+    for index in indexes:
+        assert not _index_table(index).startswith("UNIQUE")
+    assert _index_table("idx_standings_season_group_player") == "standings"
+
+
+def test_fresh_database_has_no_missing_indexes(tmp_path):
+    db_file = str(tmp_path / "elo_bot.db")
+    init_db(db_file)
+    missing, extra, wrong_type = check_database_structure(db_file)
+    assert (missing, extra, wrong_type) == ([], [], [])
+
+
+def test_create_indexes_recreates_unique_indexes(tmp_path):
+    db_file = str(tmp_path / "elo_bot.db")
+    init_db(db_file)
+    conn = sqlite3.connect(db_file)
+    conn.execute("DROP INDEX idx_standings_season_group_player")
+    _create_indexes(conn.cursor(), "standings")
+    conn.commit()
+    conn.close()
+    assert "idx_standings_season_group_player" in _indexes(db_file, "standings")
@@ -0,0 +1,40 @@
+import asyncio
+import os
+
+import database_connection
+from benchmarks.synthetic_league import build_league
+from database import resolve_group
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_alias_resolves_with_a_subgroup_suffix(tmp_path, monkeypatch):
+    monkeypatch.chdir(ROOT)
+    database_connection.configure(profile="default")
+    db_file = str(tmp_path / "elo_bot.db")
+    build_league(db_file, players=20, seasons=1, seed=0)
+
+    async def scenario():
+        conn = await database_connection.connect(db_file)
+        try:
+            await conn.executemany(
+                "INSERT INTO groups (season_number, name, group_key) VALUES (?, ?, ?)",
+                [
+                    (999, "Pro League-1", "pro league-1"),
+                    (999, "Pro League", "pro league"),
+                ],
+            )
+            await conn.commit()
+            names = ["Procrastination-1", "lazy league-a", "LAZY", "Pro League-1"]
+            return [
+                (await resolve_group(999, name) or {}).get("name") for name in names
+            ]
+        finally:
+            await database_connection.close()
+
+    assert asyncio.run(scenario()) == [
+        "Pro League-1",
+        "Pro League-1",
+        "Pro League",
+        "Pro League-1",
+    ]
@@ -0,0 +1,23 @@
+from leaderboard_index import LeaderboardCache, LRUCache
+
+
+def test_lru_cache_evicts_least_recently_used():
+    cache = LRUCache(max_entries=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1
+    cache.put("c", 3)
+    assert cache.get("b") is None
+    assert (cache.get("a"), cache.get("c")) == (1, 3)
+    cache.clear()
+    assert cache.get("a") is None
+
+
+def test_leaderboard_cache_counts_hits_misses_and_invalidations():
+    cache = LeaderboardCache(max_entries=2)
+    cache.put("a", 1)
+    cache.get("a")
+    cache.get("b")
+    cache.clear()
+    cache.clear()
+    assert cache.stats() == {"hits": 1, "misses": 1, "invalidations": 1, "entries": 0}
@@ -0,0 +1,117 @@
+import random
+import statistics
+
+from partitioner import snake_partition, subgroup_sizes
+
+
+def _legacy_sizes(count):
+    # The sizing loop plan_subgroups used before the closed form.
+    result = []
+    while count > 12:
+        count -= 6
+        result.append(6)
+    remainder = count // 2
+    result.append(remainder)
+    result.append(count - remainder)
+    for i in range(len(result)):
+        for j in range(len(result)):
+            if i != j:
+                while result[i] > result[j]:
+                    result[j] += 1
+                    result[i] -= 1
+    return result
+
+
+def _league(rng, count):
+    return [(player_id, rng.gauss(1450, 150)) for player_id in range(count)]
+
+
+def test_sizes_sum_to_count_and_differ_by_at_most_one():
+    for count in range(1, 3000):
+        sizes = subgroup_sizes(count)
+        assert sum(sizes) == count
+        assert max(sizes) - min(sizes) <= 1
+
+
+def test_group_count_matches_legacy_sizing():
+    for count in range(8, 1000):
+        assert len(subgroup_sizes(count)) == len(_legacy_sizes(count))
+
+
+def test_partition_fills_the_planned_sizes_with_every_player_once():
+    rng = random.Random(0)
+    for _ in range(200):
+        players = _league(rng, rng.randint(8, 500))
+        sizes = subgroup_sizes(len(players))
+        for seed in (None, rng.random()):
+            groups = snake_partition(players, sizes, seed)
+            assert [len(group) for group in groups] == sizes
+            assert sorted(p for group in groups for p in group) == sorted(
+                player_id for player_id, _elo in players
+            )
+
+
+def test_every_group_gets_one_player_per_elo_tier():
+    rng = random.Random(1)
+    for _ in range(200):
+        players = _league(rng, rng.randint(8, 500))
+        sizes = subgroup_sizes(len(players))
+        ordered = sorted(players, key=lambda player: (-player[1], player[0]))
+        tier = {player_id: i // len(sizes) for i, (player_id, _) in enumerate(ordered)}
+        for seed in (None, rng.random()):
+            for group in snake_partition(players, sizes, seed):
+                assert sorted(tier[p] for p in group) == list(range(len(group)))
+
+
+def test_mean_elo_gap_between_groups_is_bounded():
+    rng = random.Random(2)
+    for _ in range(200):
+        players = _league(rng, rng.randint(8, 500))
+        elo = dict(players)
+        sizes = subgroup_sizes(len(players))
+        # One player per tier means the gap between two groups' means over the
+        # full tiers is at most the spread of the ratings divided by the group
+        # size; the last, partial tier can add one more such step.
+        spread = max(elo.values()) - min(elo.values())
+        bound = 2 * spread / min(sizes)
+        for seed in (None, rng.random()):
+            means = [
+                statistics.fmean(elo[p] for p in group)
+                for group in snake_partition(players, sizes, seed)
+            ]
+            assert max(means) - min(means) <= bound
+
+
+def test_snake_partition_beats_a_random_split_on_strength_balance():
+    rng = random.Random(3)
+    snake_gaps, random_gaps = [], []
+    for _ in range(100):
+        players = _league(rng, rng.randint(24, 300))
+        elo = dict(players)
+        sizes = subgroup_sizes(len(players))
+        means = [
+            statistics.fmean(elo[p] for p in group)
+            for group in snake_partition(players, sizes)
+        ]
+        snake_gaps.append(max(means) - min(means))
+        shuffled = [player_id for player_id, _elo in players]
+        rng.shuffle(shuffled)
+        means, start = [], 0
+        for size in sizes:
+            means.append(
+                statistics.fmean(elo[p] for p in shuffled[start : start + size])
+            )
+            start += size
+        random_gaps.append(max(means) - min(means))
+    assert statistics.fmean(snake_gaps) < statistics.fmean(random_gaps) / 2
+
+
+def test_fixed_seed_is_deterministic():
+    rng = random.Random(4)
+    players = _league(rng, 137)
+    sizes = subgroup_sizes(len(players))
+    assert snake_partition(players, sizes, 42) == snake_partition(players, sizes, 42)
+    assert snake_partition(players, sizes) == snake_partition(
+        list(reversed(players)), sizes
+    )
+    assert snake_partition(players, sizes, 42) != snake_partition(players, sizes, 43)
@@ -0,0 +1,52 @@
+import asyncio
+import os
+
+import database_connection
+from benchmarks.synthetic_league import build_league
+from database import add_and_resolve_report, get_player_data, punish_player
+from replay import apply_replay, diff_against_players, replay_history
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_apply_replay_keeps_inactivity_penalties(tmp_path, monkeypatch):
+    monkeypatch.chdir(ROOT)
+    database_connection.configure(profile="default")
+    db_file = str(tmp_path / "elo_bot.db")
+    build_league(db_file, players=60, seasons=2, seed=0)
+
+    async def scenario():
+        await database_connection.connect(db_file)
+        try:
+            # The synthetic ratings aren't derived from its games, start from
+            # a replayed league.
+            await apply_replay(await replay_history())
+            (season,) = await database_connection.fetch_one(
+                "SELECT season_number FROM seasons WHERE active = 1"
+            )
+            p1, p2 = await database_connection.fetch_one(
+                """SELECT player1_id, player2_id FROM pairings
+                     WHERE season_number = ? AND result1 IS NULL LIMIT 1""",
+                (season,),
+            )
+            before = (await get_player_data(p1))["elo"]
+            await punish_player(p1, before, missed_seasons=2)
+            penalised = (await get_player_data(p1))["elo"]
+            assert penalised < before
+
+            # Games after the penalty have to be rated from the lowered elo.
+            await add_and_resolve_report(p1, p2, 1, "w")
+            await add_and_resolve_report(p2, p1, 1, "l")
+            await add_and_resolve_report(p1, p2, 2, "d")
+            await add_and_resolve_report(p2, p1, 2, "d")
+            live = (await get_player_data(p1))["elo"]
+
+            result = await replay_history()
+            assert await diff_against_players(result) == []
+            await apply_replay(result)
+            return live, (await get_player_data(p1))["elo"]
+        finally:
+            await database_connection.close()
+
+    live, replayed = asyncio.run(scenario())
+    assert abs(live - replayed) < 0.01
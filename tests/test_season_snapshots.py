@@ -0,0 +1,57 @@
+import asyncio
+import os
+
+import database_connection
+from benchmarks.synthetic_league import build_league
+from database import (
+    bundle_leaderboard,
+    bundle_season_leaderboard,
+    get_latest_season,
+    setup_future_season,
+    update_player_stats,
+)
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _ranking(bundle):
+    total, you, rank, surrounding, rows = bundle
+    return (
+        total,
+        you and you["elo"],
+        rank,
+        [(row["id"], row["elo"]) for row in surrounding],
+        [(row["id"], row["elo"]) for row in rows],
+    )
+
+
+def test_season_leaderboard_shows_the_ratings_at_the_boundary(tmp_path, monkeypatch):
+    monkeypatch.chdir(ROOT)
+    database_connection.configure(profile="default")
+    db_file = str(tmp_path / "elo_bot.db")
+    build_league(db_file, players=40, seasons=2, seed=0)
+
+    async def scenario():
+        await database_connection.connect(db_file)
+        try:
+            season, _active = await get_latest_season()
+            (player_id,) = await database_connection.fetch_one(
+                "SELECT id FROM players ORDER BY elo LIMIT 1"
+            )
+            before = await bundle_leaderboard(player_id, 5, None)
+            await setup_future_season(season, season + 1)
+            # A rating change after the season ended must not show up.
+            await update_player_stats(player_id, 3000, wins=1)
+            ended = await bundle_season_leaderboard(season, "end", player_id, 5, None)
+            live = await bundle_leaderboard(player_id, 5, None)
+            missing = await bundle_season_leaderboard(
+                season + 1, "end", player_id, 5, None
+            )
+            return before, ended, live, missing
+        finally:
+            await database_connection.close()
+
+    before, ended, live, missing = asyncio.run(scenario())
+    assert _ranking(ended) == _ranking(before)
+    assert _ranking(live) != _ranking(before)
+    assert missing == (0, None, None, [], [])
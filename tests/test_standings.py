@@ -0,0 +1,39 @@
+import asyncio
+import os
+
+import database_connection
+from benchmarks.synthetic_league import build_league
+from database import add_and_resolve_report, rebuild_standings
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_rebuild_keeps_confirmations_made_while_it_runs(tmp_path, monkeypatch):
+    # elo_roles.csv is read relative to the working directory.
+    monkeypatch.chdir(ROOT)
+    database_connection.configure(profile="default")
+    db_file = str(tmp_path / "elo_bot.db")
+    build_league(db_file, players=60, seasons=2, seed=0)
+
+    async def scenario():
+        await database_connection.connect(db_file)
+        try:
+            (season,) = await database_connection.fetch_one(
+                "SELECT season_number FROM seasons WHERE active = 1"
+            )
+            p1, p2 = await database_connection.fetch_one(
+                """SELECT player1_id, player2_id FROM pairings
+                     WHERE season_number = ? AND result1 IS NULL LIMIT 1""",
+                (season,),
+            )
+            await add_and_resolve_report(p1, p2, 1, "w")
+
+            await asyncio.gather(
+                rebuild_standings(), add_and_resolve_report(p2, p1, 1, "l")
+            )
+            return await rebuild_standings()
+        finally:
+            await database_connection.close()
+
+    _rows, inconsistent = asyncio.run(scenario())
+    assert inconsistent == 0